@@ -0,0 +1,20 @@
+# api/health_handlers.py
+from fastapi import APIRouter
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+health_router = APIRouter()
+
+
+@health_router.get("/live")
+async def live() -> dict:
+    """Процесс запущен и отвечает."""
+    return {"status": "ok"}
+
+
+@health_router.get("/ready")
+async def ready(request: Request) -> JSONResponse:
+    """Прогрев при старте завершен, можно направлять трафик."""
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "warming up"})
+    return JSONResponse(content={"status": "ready"})
@@ -1,51 +1,132 @@
 from datetime import timedelta
+from logging import getLogger
+from typing import Iterable
 from typing import Optional
+from typing import Union
+from uuid import UUID
 
 from fastapi import APIRouter
 from fastapi import Depends
 from fastapi import HTTPException
+from fastapi import Request
 from fastapi import status
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.security import OAuth2PasswordRequestForm
-from jose import jwt
-from jose import JWTError
-from api.schemas import Token
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.models import User
+from api.responses import user_to_dict
+from api.schemas import Token
+from db.loaders import get_user_loader
+from db.loaders import UserLoader
+from db.repositories import UserReadRepository
+from db.repositories import UserRecord
 from db.repositories import UserRepository
-from db.session import get_db
-from utils import settings
-from utils.hasher import Hasher
+from db.session import Database
+from db.session import DatabaseBusyError
+from db.session import get_database
+from db.session import get_read_db
 from utils.security import create_access_token
+from utils.security import decode_access_token
+from utils.security import TokenPrincipal
+from utils.services import get_services
+from utils.services import Services
+
+logger = getLogger(__name__)
 
 login_router = APIRouter()
 
 
-async def get_user_by_email(email: str, db_session: AsyncSession) -> Optional[User]:
+def forget_users(
+    services: Services, users: Iterable, revoke_tokens: bool = False
+) -> None:
+    """Сбрасывает кеш пользователей и, если нужно, отзывает их токены.
+
+    Вызывать после COMMIT: запрос аутентификации между UPDATE и COMMIT
+    прочитал бы старую строку и снова положил ее в кеш.
+    """
+    for user in users:
+        if services.principal_cache is not None:
+            services.principal_cache.invalidate_user(user.id)
+        if revoke_tokens:
+            services.revocations.revoke(user.id, user.token_version)
+
+
+async def get_user_by_email(
+    email: str, db_session: AsyncSession
+) -> Optional[UserRecord]:
     async with db_session as session:
-        async with session.begin():
+        user_repository = UserReadRepository(session)
+        return await user_repository.get_by_email(email=email)
+
+
+async def _rehash_password(
+    user: UserRecord, hashed_password: str, database: Database, services: Services
+):
+    """Сохраняет пересчитанный хеш; ошибка не должна ломать логин.
+
+    Сессия для записи открывается только здесь, то есть только если хеш
+    устарел: обычный логин занимает один слот пула и только читает.
+    """
+    try:
+        async with database.autocommit_session_scope() as session:
             user_repository = UserRepository(session)
-            return await user_repository.get_by_email(email=email)
+            await user_repository.set_password_hash(user.id, hashed_password)
+    except (SQLAlchemyError, DatabaseBusyError) as err:
+        logger.warning("Could not store rehashed password: %s", err)
+        return
+    forget_users(services, [user])
 
 
 async def authenticate_user(
-    email: str, password: str, db_session: AsyncSession
-) -> Optional[User]:
+    email: str,
+    password: str,
+    db_session: AsyncSession,
+    services: Services,
+    database: Optional[Database] = None,
+) -> Optional[UserRecord]:
     user = await get_user_by_email(email=email, db_session=db_session)
     if user is None:
         return None
-    if not Hasher.verify_password(password, user.hashed_password):
+    is_valid, new_hash = await services.hasher.verify_and_update(
+        password, user.hashed_password
+    )
+    if not is_valid:
         return None
+    # Хеш в устаревшей схеме или с меньшей стоимостью пересчитан при проверке
+    if new_hash is not None and database is not None:
+        await _rehash_password(user, new_hash, database, services)
     return user
 
 
 @login_router.post("/token", response_model=Token)
 async def login_for_access_token(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db_session: AsyncSession = Depends(get_db),
+    db_session: AsyncSession = Depends(get_read_db),
+    database: Database = Depends(get_database),
+    services: Services = Depends(get_services),
 ):
-    user = await authenticate_user(form_data.username, form_data.password, db_session)
+    # Отсекаем перебор паролей до похода в базу и bcrypt
+    if services.login_rate_limiter is not None:
+        retry_after = await services.login_rate_limiter.check(
+            email=form_data.username,
+            ip=request.client.host if request.client else None,
+        )
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts, try again later",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+    user = await authenticate_user(
+        form_data.username,
+        form_data.password,
+        db_session,
+        services,
+        database,
+    )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -53,9 +134,12 @@ async def login_for_access_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token_expiration = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token_expiration = timedelta(
+        minutes=services.settings.ACCESS_TOKEN_EXPIRE_MINUTES
+    )
     access_token = create_access_token(
-        data={"sub": user.email, "other_custom_data": [1, 2, 3, 4]},
+        data={"sub": user.email, "uid": str(user.id), "ver": user.token_version},
+        settings=services.settings,
         expires_delta=access_token_expiration,
     )
 
@@ -66,30 +150,60 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login/token")
 
 
 async def get_current_user_from_token(
-    token: str = Depends(oauth2_scheme), db_session: AsyncSession = Depends(get_db)
-):
+    token: str = Depends(oauth2_scheme),
+    loader: UserLoader = Depends(get_user_loader),
+    services: Services = Depends(get_services),
+) -> Union[UserRecord, TokenPrincipal]:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
     )
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
+        payload = decode_access_token(token, services.settings)
         email: str = payload.get("sub")
-        print("Extracted email: ", email)
+        logger.debug("Extracted email: %s", email)
         if email is None:
             raise credentials_exception
-    except JWTError:
+        user_id = UUID(payload["uid"]) if "uid" in payload else None
+        token_version: Optional[int] = payload.get("ver")
+        issued_at: Optional[float] = payload.get("iat")
+    except (ValueError, TypeError):
         raise credentials_exception
-    user = await get_user_by_email(email=email, db_session=db_session)
+
+    # Подпись подтверждает uid и ver, база нужна только для отзыва токенов,
+    # а он хранится в services.revocations. Токены старше процесса идут
+    # в базу: их отзыв мог случиться до перезапуска.
+    stateless = (
+        services.settings.TOKEN_STATELESS
+        and user_id is not None
+        and token_version is not None
+        and services.revocations.covers(issued_at)
+    )
+    if stateless:
+        if services.revocations.is_revoked(user_id, token_version):
+            raise credentials_exception
+        return TokenPrincipal(id=user_id, email=email, token_version=token_version)
+
+    cache = services.principal_cache
+    user = cache.get(email) if cache is not None else None
     if user is None:
+        # Строку, прочитанную до сброса пользователя, кешировать нельзя
+        generation = cache.generation if cache is not None else 0
+        user = await loader.load_by_email(email)
+        if user is None:
+            raise credentials_exception
+        if cache is not None:
+            cache.set(email, user, generation=generation)
+    if token_version is not None and token_version != user.token_version:
         raise credentials_exception
     return user
 
 
 @login_router.get("/test_auth_endpoint")
 async def sample_endpoint_under_jwt(
-    current_user: User = Depends(get_current_user_from_token),
+    current_user: UserRecord = Depends(get_current_user_from_token),
 ):
+    # UserRecord - кортеж, без явного преобразования он ушел бы списком
+    if isinstance(current_user, UserRecord):
+        current_user = user_to_dict(current_user)
     return {"Success": True, "current_user": current_user}
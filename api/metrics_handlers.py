@@ -0,0 +1,14 @@
+# api/metrics_handlers.py
+from fastapi import APIRouter
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from utils.metrics import render_latest
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """Метрики в текстовом формате Prometheus (сумма по всем воркерам)."""
+    return Response(content=render_latest(), media_type=CONTENT_TYPE_LATEST)
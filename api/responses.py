@@ -0,0 +1,32 @@
+# api/responses.py
+from typing import Any
+
+from fastapi.responses import Response
+from pydantic_core import to_json
+
+from utils.timing import timed
+
+
+def user_to_dict(user) -> dict:
+    """Поля UserResponse из строки репозитория, без валидации pydantic."""
+    return {
+        "id": user.id,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "email": user.email,
+        "is_active": user.is_active,
+    }
+
+
+class FastJSONResponse(Response):
+    """JSON-ответ, сериализуемый напрямую через pydantic-core.
+
+    Когда обработчик возвращает Response, FastAPI не прогоняет данные через
+    ``response_model`` повторно; модель остается только для OpenAPI схемы.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        with timed("serialize"):
+            return to_json(content)
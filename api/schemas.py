@@ -1,6 +1,7 @@
 # api/schemas.py
 import re
 import uuid
+from typing import List
 from typing import Optional
 
 from fastapi import HTTPException
@@ -61,17 +62,62 @@ class UserCreateRequest(BaseSchema):
         return value
 
 
+class UserBatchCreateRequest(BaseSchema):
+    """Схема для запроса пакетного создания пользователей.
+
+    Элементы проверяются по отдельности в обработчике, чтобы ошибка в одном
+    из них не отклоняла весь пакет.
+    """
+
+    users: List[dict]
+
+    @validator("users")
+    def validate_users(cls, value):
+        if not value:
+            raise HTTPException(
+                status_code=422, detail="At least one user should be provided"
+            )
+        return value
+
+
+class UserBatchItemError(BaseSchema):
+    """Схема ошибки для отдельного элемента пакета."""
+
+    index: int
+    email: Optional[str] = None
+    detail: str
+
+
+class UserBatchCreateResponse(BaseSchema):
+    """Схема для ответа на пакетное создание пользователей."""
+
+    created: List[UserResponse]
+    errors: List[UserBatchItemError]
+
+
+class UserListResponse(BaseSchema):
+    """Схема для ответа со страницей пользователей."""
+
+    items: List[UserResponse]
+    next_cursor: Optional[str] = None
+
+
+class UserBatchGetResponse(BaseSchema):
+    """Схема для ответа на получение пользователей по списку ID."""
+
+    items: List[UserResponse]
+    not_found: List[uuid.UUID]
+
+
 class UserDeleteResponse(BaseSchema):
     """Схема для ответа при удалении пользователя."""
 
     id: uuid.UUID
 
 
-class UserUpdateResponse(BaseSchema):
+class UserUpdateResponse(UserResponse):
     """Схема для ответа при обновлении пользователя."""
 
-    id: uuid.UUID
-
 
 class UserUpdateRequest(BaseSchema):
     """Схема для запроса обновления пользователя."""
@@ -110,3 +156,53 @@ class UserUpdateRequest(BaseSchema):
 class Token(BaseModel):
     access_token: str
     token_type: str
+
+
+class UserBatchUpdateItem(UserUpdateRequest):
+    """Схема изменения одного пользователя в пакетном обновлении."""
+
+    id: uuid.UUID
+
+
+class UserBatchUpdateRequest(BaseSchema):
+    """Схема для запроса пакетного обновления пользователей."""
+
+    items: List[UserBatchUpdateItem]
+
+    @validator("items")
+    def validate_items(cls, value):
+        if not value:
+            raise HTTPException(
+                status_code=422, detail="At least one user should be provided"
+            )
+        if len({item.id for item in value}) != len(value):
+            raise HTTPException(status_code=422, detail="User ids must be unique")
+        for item in value:
+            if not item.dict(exclude_none=True, exclude={"id"}):
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"At least one parameter for user {item.id} "
+                    "update should be provided",
+                )
+        return value
+
+
+class UserBatchDeleteRequest(BaseSchema):
+    """Схема для запроса пакетного удаления пользователей."""
+
+    ids: List[uuid.UUID]
+
+    @validator("ids")
+    def validate_ids(cls, value):
+        if not value:
+            raise HTTPException(
+                status_code=422, detail="At least one user id should be provided"
+            )
+        return list(dict.fromkeys(value))
+
+
+class UserBatchWriteResponse(BaseSchema):
+    """Схема для ответа на пакетное изменение или удаление пользователей."""
+
+    affected: List[uuid.UUID]
+    not_found: List[uuid.UUID]
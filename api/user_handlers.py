@@ -1,22 +1,49 @@
 # api/handlers.py
+import base64
+import json
 from logging import getLogger
+from typing import List
+from typing import Literal
 from typing import Optional
+from typing import Tuple
 from uuid import UUID
 
 from fastapi import APIRouter
 from fastapi import Depends
 from fastapi import HTTPException
+from fastapi import Query
+from pydantic import ValidationError
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from api.login_handlers import forget_users
+from api.responses import FastJSONResponse
+from api.responses import user_to_dict
+from api.schemas import UserBatchCreateRequest
+from api.schemas import UserBatchCreateResponse
+from api.schemas import UserBatchDeleteRequest
+from api.schemas import UserBatchGetResponse
+from api.schemas import UserBatchItemError
+from api.schemas import UserBatchUpdateRequest
+from api.schemas import UserBatchWriteResponse
 from api.schemas import UserCreateRequest
 from api.schemas import UserDeleteResponse
+from api.schemas import UserListResponse
 from api.schemas import UserResponse
 from api.schemas import UserUpdateRequest
 from api.schemas import UserUpdateResponse
+from db.loaders import get_user_loader
+from db.loaders import UserLoader
+from db.repositories import revokes_tokens
+from db.repositories import UserReadRepository
 from db.repositories import UserRepository
+from db.session import Database
+from db.session import get_autocommit_db
+from db.session import get_database
 from db.session import get_db
-from utils.hasher import Hasher
+from db.session import get_read_db
+from utils.services import get_services
+from utils.services import Services
 
 logger = getLogger(__name__)
 
@@ -24,68 +51,330 @@ user_router = APIRouter()
 
 
 async def _create_user(
-    body: UserCreateRequest, db: AsyncSession = Depends(get_db)
-) -> UserResponse:
-    """Внутренняя функция для создания пользователя."""
+    body: UserCreateRequest, db: AsyncSession, database: Database, services: Services
+) -> Optional[dict]:
+    """Внутренняя функция для создания пользователя.
+
+    Возвращает None, если email занят. Фильтр taken_emails не дает ложных
+    отрицаний, поэтому в базу за проверкой идем только при попадании в него,
+    и в любом случае до того, как тратить время на хеширование пароля.
+    Проверка - один SELECT в AUTOCOMMIT, без BEGIN и ROLLBACK.
+    """
+    if body.email in services.taken_emails:
+        async with database.read_session_scope() as session:
+            if await UserReadRepository(session).email_exists(body.email):
+                return None
+
+    hashed_password = await services.hasher.get_password_hash(body.password)
     async with db as session:
-        async with session.begin():
-            repository = UserRepository(session)
-            user = await repository.create(
-                first_name=body.first_name,
-                last_name=body.last_name,
-                email=body.email,
-                hashed_password=Hasher.get_password_hash(body.password),
+        repository = UserRepository(session)
+        user = await repository.create(
+            first_name=body.first_name,
+            last_name=body.last_name,
+            email=body.email,
+            hashed_password=hashed_password,
+        )
+    services.taken_emails.add(body.email)
+    return user_to_dict(user) if user else None
+
+
+def _check_batch_size(size: int, max_size: int) -> None:
+    if size > max_size:
+        raise HTTPException(
+            status_code=422, detail=f"Batch size must not exceed {max_size}"
+        )
+
+
+def _validation_error_detail(err: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+        for error in err.errors()
+    )
+
+
+def _email_taken_error(index: int, email: str) -> UserBatchItemError:
+    return UserBatchItemError(
+        index=index, email=email, detail=f"User with email {email} already exists"
+    )
+
+
+async def _create_users_batch(
+    body: UserBatchCreateRequest, db, database: Database, services: Services
+) -> dict:
+    """Внутренняя функция для пакетного создания пользователей.
+
+    Повторы email внутри пакета и уже занятые email отсекаются до
+    хеширования, как и в ``_create_user``: пароли хешируются только для
+    тех, кого действительно можно создать.
+    """
+    errors: List[UserBatchItemError] = []
+    valid: List[Tuple[int, UserCreateRequest]] = []
+    seen_emails = set()
+    for index, item in enumerate(body.users):
+        email = item.get("email") if isinstance(item.get("email"), str) else None
+        try:
+            user = UserCreateRequest(**item)
+        except ValidationError as err:
+            errors.append(
+                UserBatchItemError(
+                    index=index, email=email, detail=_validation_error_detail(err)
+                )
             )
+            continue
+        except HTTPException as err:
+            errors.append(
+                UserBatchItemError(index=index, email=email, detail=err.detail)
+            )
+            continue
 
-            return UserResponse(
-                id=user.id,
-                first_name=user.first_name,
-                last_name=user.last_name,
-                email=user.email,
-                is_active=user.is_active,
+        if user.email in seen_emails:
+            errors.append(
+                UserBatchItemError(
+                    index=index, email=user.email, detail="Duplicate email in batch"
+                )
             )
+            continue
+        seen_emails.add(user.email)
+        valid.append((index, user))
+
+    maybe_taken = [
+        user.email for _, user in valid if user.email in services.taken_emails
+    ]
+    if maybe_taken:
+        async with database.read_session_scope() as session:
+            taken = set(await UserReadRepository(session).existing_emails(maybe_taken))
+        for index, user in valid:
+            if user.email in taken:
+                errors.append(_email_taken_error(index, user.email))
+        valid = [(index, user) for index, user in valid if user.email not in taken]
 
+    created_by_email = {}
+    if valid:
+        hashed_passwords = await services.hasher.get_password_hashes(
+            [user.password for _, user in valid]
+        )
+        # Пачек может быть несколько: вставка атомарна только в транзакции
+        async with db as session:
+            async with session.begin():
+                repository = UserRepository(session)
+                created = await repository.create_many(
+                    [
+                        dict(
+                            first_name=user.first_name,
+                            last_name=user.last_name,
+                            email=user.email,
+                            hashed_password=hashed_password,
+                        )
+                        for (_, user), hashed_password in zip(valid, hashed_passwords)
+                    ],
+                    chunk_size=services.settings.USER_BATCH_CHUNK_SIZE,
+                )
+        for _, user in valid:
+            services.taken_emails.add(user.email)
+        created_by_email = {user.email: user for user in created}
 
-async def _get_user(user_id: UUID, db) -> Optional[UserResponse]:
+    created_users: List[dict] = []
+    for index, user in valid:
+        created_user = created_by_email.get(user.email)
+        if created_user is None:
+            errors.append(_email_taken_error(index, user.email))
+            continue
+        created_users.append(user_to_dict(created_user))
+
+    errors.sort(key=lambda error: error.index)
+    return {"created": created_users, "errors": errors}
+
+
+async def _get_user(user_id: UUID, loader: UserLoader) -> Optional[dict]:
     """Внутренняя функция для получения пользователя."""
+    user = await loader.load(user_id)
+    return user_to_dict(user) if user else None
+
+
+def _parse_ids(ids: List[str], max_ids: int) -> List[UUID]:
+    # Поддерживаются и ?ids=a&ids=b, и ?ids=a,b
+    raw_ids = [raw_id for value in ids for raw_id in value.split(",") if raw_id]
+    if not raw_ids:
+        raise HTTPException(
+            status_code=422, detail="At least one user id should be provided"
+        )
+    if len(raw_ids) > max_ids:
+        raise HTTPException(
+            status_code=422, detail=f"No more than {max_ids} ids are allowed"
+        )
+    try:
+        return list(dict.fromkeys(UUID(raw_id) for raw_id in raw_ids))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid user id")
+
+
+async def _get_users_batch(user_ids: List[UUID], loader: UserLoader) -> dict:
+    """Внутренняя функция для получения пользователей по списку ID."""
+    users = await loader.load_many(user_ids)
+    return {
+        "items": [user_to_dict(user) for user in users if user],
+        "not_found": [
+            user_id for user_id, user in zip(user_ids, users) if user is None
+        ],
+    }
+
+
+def _encode_cursor(order_by: str, key) -> str:
+    payload = json.dumps({"o": order_by, "k": str(key)}).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def _decode_cursor(cursor: str, order_by: str):
+    invalid_cursor = HTTPException(status_code=422, detail="Invalid cursor")
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if payload["o"] != order_by:
+            raise invalid_cursor
+        return UUID(payload["k"]) if order_by == "id" else payload["k"]
+    except (ValueError, KeyError, TypeError):
+        raise invalid_cursor
+
+
+async def _list_users(
+    order_by: str, cursor: Optional[str], limit: int, is_active: Optional[bool], db
+) -> dict:
+    """Внутренняя функция для получения страницы пользователей."""
+    after = _decode_cursor(cursor, order_by) if cursor else None
     async with db as session:
-        async with session.begin():
-            repository = UserRepository(session)
-            user = await repository.get_by_id(user_id=user_id)
-            if user:
-                return UserResponse(
-                    id=user.id,
-                    first_name=user.first_name,
-                    last_name=user.last_name,
-                    email=user.email,
-                    is_active=user.is_active,
-                )
-    return None
+        repository = UserReadRepository(session)
+        users = await repository.list_page(
+            order_by=order_by, after=after, limit=limit + 1, is_active=is_active
+        )
+
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = _encode_cursor(order_by, getattr(users[-1], order_by))
 
+    return {
+        "items": [user_to_dict(user) for user in users],
+        "next_cursor": next_cursor,
+    }
 
-async def _delete_user(user_id: UUID, db) -> Optional[UUID]:
+
+async def _delete_user(user_id: UUID, db, services: Services) -> Optional[UUID]:
     """Внутренняя функция для удаления пользователя."""
     async with db as session:
-        async with session.begin():
-            repository = UserRepository(session)
-            return await repository.delete(user_id=user_id)
+        repository = UserRepository(session)
+        user = await repository.delete(user_id=user_id)
+    if user is None:
+        return None
+    forget_users(services, [user], revoke_tokens=True)
+    return user.id
+
+
+def _batch_write_result(requested_ids: List[UUID], users) -> dict:
+    affected = {user.id for user in users}
+    return {
+        "affected": [user_id for user_id in requested_ids if user_id in affected],
+        "not_found": [user_id for user_id in requested_ids if user_id not in affected],
+    }
+
+
+async def _delete_users_batch(user_ids: List[UUID], db, services: Services) -> dict:
+    """Внутренняя функция для пакетного удаления пользователей."""
+    async with db as session:
+        repository = UserRepository(session)
+        users = await repository.delete_many(user_ids)
+    forget_users(services, users, revoke_tokens=True)
+    return _batch_write_result(user_ids, users)
+
+
+async def _update_users_batch(
+    body: UserBatchUpdateRequest, db, services: Services
+) -> dict:
+    """Внутренняя функция для пакетного обновления пользователей."""
+    changes = [item.dict(exclude_none=True) for item in body.items]
+    async with db as session:
+        repository = UserRepository(session)
+        users = await repository.update_many(changes)
+    # Токены отзывает только смена email
+    emails_changed = {change["id"] for change in changes if change.get("email")}
+    forget_users(services, [user for user in users if user.id not in emails_changed])
+    forget_users(
+        services,
+        [user for user in users if user.id in emails_changed],
+        revoke_tokens=True,
+    )
+    for user in users:
+        if user.id in emails_changed:
+            services.taken_emails.add(user.email)
+    return _batch_write_result([item.id for item in body.items], users)
 
 
-async def _update_user(user_id: UUID, update_data: dict, db) -> Optional[UUID]:
+async def _update_user(
+    user_id: UUID, update_data: dict, db, services: Services
+) -> Optional[dict]:
     """Внутренняя функция для обновления пользователя."""
     async with db as session:
-        async with session.begin():
-            repository = UserRepository(session)
-            return await repository.update(user_id, **update_data)
+        repository = UserRepository(session)
+        user = await repository.update(user_id, **update_data)
+    if user is None:
+        return None
+    forget_users(services, [user], revoke_tokens=revokes_tokens(update_data))
+    if "email" in update_data:
+        services.taken_emails.add(user.email)
+    return user_to_dict(user)
 
 
 @user_router.post("/", response_model=UserResponse)
 async def create_user(
-    body: UserCreateRequest, db: AsyncSession = Depends(get_db)
-) -> UserResponse:
+    body: UserCreateRequest,
+    db: AsyncSession = Depends(get_autocommit_db),
+    database: Database = Depends(get_database),
+    services: Services = Depends(get_services),
+) -> FastJSONResponse:
     """Создает нового пользователя."""
     try:
-        return await _create_user(body, db)
+        user = await _create_user(body, db, database, services)
+    except IntegrityError as err:
+        logger.error(err)
+        raise HTTPException(status_code=503, detail=f"Database error: {err}")
+    if user is None:
+        raise HTTPException(
+            status_code=409, detail="User with this email already exists"
+        )
+    return FastJSONResponse(user)
+
+
+@user_router.post("/batch", response_model=UserBatchCreateResponse)
+async def create_users_batch(
+    body: UserBatchCreateRequest,
+    db: AsyncSession = Depends(get_db),
+    database: Database = Depends(get_database),
+    services: Services = Depends(get_services),
+) -> FastJSONResponse:
+    """Создает пользователей пакетом, возвращая ошибки по каждому элементу."""
+    _check_batch_size(len(body.users), services.settings.USER_BATCH_CREATE_MAX_SIZE)
+    return FastJSONResponse(await _create_users_batch(body, db, database, services))
+
+
+@user_router.delete("/batch", response_model=UserBatchWriteResponse)
+async def delete_users_batch(
+    body: UserBatchDeleteRequest,
+    db: AsyncSession = Depends(get_autocommit_db),
+    services: Services = Depends(get_services),
+) -> FastJSONResponse:
+    """Удаляет пользователей пакетом одним запросом."""
+    _check_batch_size(len(body.ids), services.settings.USER_BATCH_MAX_SIZE)
+    return FastJSONResponse(await _delete_users_batch(body.ids, db, services))
+
+
+@user_router.patch("/batch", response_model=UserBatchWriteResponse)
+async def update_users_batch(
+    body: UserBatchUpdateRequest,
+    db: AsyncSession = Depends(get_autocommit_db),
+    services: Services = Depends(get_services),
+) -> FastJSONResponse:
+    """Обновляет пользователей пакетом одним запросом."""
+    _check_batch_size(len(body.items), services.settings.USER_BATCH_MAX_SIZE)
+    try:
+        return FastJSONResponse(await _update_users_batch(body, db, services))
     except IntegrityError as err:
         logger.error(err)
         raise HTTPException(status_code=503, detail=f"Database error: {err}")
@@ -93,10 +382,12 @@ async def create_user(
 
 @user_router.delete("/", response_model=UserDeleteResponse)
 async def delete_user(
-    user_id: UUID, db: AsyncSession = Depends(get_db)
+    user_id: UUID,
+    db: AsyncSession = Depends(get_autocommit_db),
+    services: Services = Depends(get_services),
 ) -> UserDeleteResponse:
     """Удаляет пользователя."""
-    deleted_user_id = await _delete_user(user_id, db)
+    deleted_user_id = await _delete_user(user_id, db, services)
     if not deleted_user_id:
         raise HTTPException(
             status_code=404, detail=f"User with id {user_id} not found."
@@ -105,20 +396,59 @@ async def delete_user(
 
 
 @user_router.get("/", response_model=UserResponse)
-async def get_user(user_id: UUID, db: AsyncSession = Depends(get_db)) -> UserResponse:
+async def get_user(
+    user_id: UUID, loader: UserLoader = Depends(get_user_loader)
+) -> FastJSONResponse:
     """Получает пользователя по ID."""
-    user = await _get_user(user_id, db)
+    user = await _get_user(user_id, loader)
     if not user:
         raise HTTPException(
             status_code=404, detail=f"User with id {user_id} not found."
         )
-    return user
+    return FastJSONResponse(user)
+
+
+@user_router.get("/batch", response_model=UserBatchGetResponse)
+async def get_users_batch(
+    ids: List[str] = Query(...),
+    loader: UserLoader = Depends(get_user_loader),
+    services: Services = Depends(get_services),
+) -> FastJSONResponse:
+    """Получает пользователей по списку ID одним запросом."""
+    user_ids = _parse_ids(ids, services.settings.USER_BATCH_GET_MAX_IDS)
+    return FastJSONResponse(await _get_users_batch(user_ids, loader))
+
+
+@user_router.get("/list", response_model=UserListResponse)
+async def list_users(
+    order_by: Literal["id", "email"] = "id",
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    is_active: Optional[bool] = None,
+    db: AsyncSession = Depends(get_read_db),
+    services: Services = Depends(get_services),
+) -> FastJSONResponse:
+    """Возвращает страницу пользователей, следующая страница - по next_cursor."""
+    # Границы из settings приложения, а не из Query: они известны только
+    # после create_app
+    settings = services.settings
+    if limit is None:
+        limit = settings.USER_LIST_DEFAULT_PAGE_SIZE
+    if limit > settings.USER_LIST_MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=422,
+            detail=f"limit must not exceed {settings.USER_LIST_MAX_PAGE_SIZE}",
+        )
+    return FastJSONResponse(await _list_users(order_by, cursor, limit, is_active, db))
 
 
 @user_router.patch("/", response_model=UserUpdateResponse)
 async def update_user(
-    user_id: UUID, body: UserUpdateRequest, db: AsyncSession = Depends(get_db)
-) -> UserUpdateResponse:
+    user_id: UUID,
+    body: UserUpdateRequest,
+    db: AsyncSession = Depends(get_autocommit_db),
+    services: Services = Depends(get_services),
+) -> FastJSONResponse:
     """Обновляет данные пользователя."""
     update_data = body.dict(exclude_none=True)
     if not update_data:
@@ -127,18 +457,16 @@ async def update_user(
             detail="At least one parameter for user update should be provided",
         )
 
-    user = await _get_user(user_id, db)
-    if not user:
-        raise HTTPException(
-            status_code=404, detail=f"User with id {user_id} not found."
-        )
-
     try:
-        updated_user_id = await _update_user(
-            update_data=update_data, db=db, user_id=user_id
+        updated_user = await _update_user(
+            update_data=update_data, db=db, user_id=user_id, services=services
         )
     except IntegrityError as err:
         logger.error(err)
         raise HTTPException(status_code=503, detail=f"Database error: {err}")
 
-    return UserUpdateResponse(id=updated_user_id)
+    if not updated_user:
+        raise HTTPException(
+            status_code=404, detail=f"User with id {user_id} not found."
+        )
+    return FastJSONResponse(updated_user)
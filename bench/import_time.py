@@ -0,0 +1,87 @@
+# bench/import_time.py
+"""Время холодного старта: импорт модуля приложения и create_app().
+
+Каждый замер идет в отдельном интерпретаторе с ``-X importtime``, чтобы
+модули не были уже загружены. Импорт ``main`` уже включает один вызов
+``create_app()`` (``main.app``). Печатает медиану по запускам и самые дорогие
+импорты последнего запуска.
+
+Пример::
+
+    python -m bench.import_time --repeat 5 --top 15
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+# Печатает время create_app() в микросекундах последней строкой stdout
+SNIPPET = """
+import time
+import {module}
+started = time.perf_counter()
+{module}.create_app()
+print(int((time.perf_counter() - started) * 1e6))
+"""
+
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """Суммарное (cumulative) время импорта по модулям, в микросекундах."""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+
+def measure(module: str) -> Tuple[int, int, Dict[str, int]]:
+    """Возвращает (импорт модуля, create_app, время по модулям) в мкс."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SNIPPET.format(module=module)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative = parse_importtime(result.stderr)
+    create_app_us = int(result.stdout.strip().splitlines()[-1])
+    return cumulative[module], create_app_us, cumulative
+
+
+def main(module: str, repeat: int, top: int) -> None:
+    import_times: List[int] = []
+    create_app_times: List[int] = []
+    cumulative: Dict[str, int] = {}
+    for _ in range(repeat):
+        import_us, create_app_us, cumulative = measure(module)
+        import_times.append(import_us)
+        create_app_times.append(create_app_us)
+
+    print(f"import {module:<24}{statistics.median(import_times) / 1000:>10.1f} ms")
+    print(
+        f"{module}.create_app(){'':<14}"
+        f"{statistics.median(create_app_times) / 1000:>10.1f} ms"
+    )
+    print()
+    # Пакеты верхнего уровня; зависимости одного пакета входят и в его
+    # строку, и в свою собственную
+    top_level = sorted(
+        ((name, us) for name, us in cumulative.items() if "." not in name),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    for name, us in top_level[:top]:
+        print(f"{name:<32}{us / 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    main(args.module, args.repeat, args.top)
@@ -0,0 +1,223 @@
+# bench/loadtest.py
+"""Нагрузочный тест для эндпоинтов логина и пользователей.
+
+По умолчанию гоняет приложение в процессе через ``httpx.ASGITransport``
+против базы из ``REAL_DATABASE_URL`` (docker-compose-local.yaml). С флагом
+``--base-url`` бьет в уже запущенный uvicorn.
+
+Все логины идут с одного адреса и по небольшому набору email, поэтому
+ограничение попыток входа ответило бы 429 почти на все. В процессе оно
+выключается, а uvicorn для теста нужно запускать с
+``LOGIN_RATE_LIMIT_ENABLED=false``.
+
+Пример::
+
+    make up && alembic upgrade head
+    python -m bench.loadtest --duration 30 --concurrency 32
+    python -m bench.loadtest --base-url http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from httpx import ASGITransport
+from httpx import AsyncClient
+
+PASSWORD = "loadtest-password"
+
+# Веса операций смешанной нагрузки
+DEFAULT_MIX = {
+    "POST /login/token": 1,
+    "GET /login/test_auth_endpoint": 4,
+    "POST /user/": 1,
+    "GET /user/": 6,
+    "PATCH /user/": 2,
+    "DELETE /user/": 1,
+}
+
+
+def _user_payload() -> dict:
+    return {
+        "first_name": "load",
+        "last_name": "test",
+        "email": f"load-{uuid.uuid4().hex}@test.com",
+        "password": PASSWORD,
+    }
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, int(round(percent / 100 * len(sorted_values))) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def error_rate(succeeded: int, failed: int) -> float:
+    attempts = succeeded + failed
+    return failed / attempts * 100 if attempts else 0.0
+
+
+class LoadTest:
+    def __init__(self, client: AsyncClient, mix: Dict[str, int], seed_users: int):
+        self.client = client
+        self.routes = list(mix)
+        self.weights = [mix[route] for route in self.routes]
+        self.seed_users = seed_users
+
+        self.users: List[dict] = []
+        self.tokens: List[str] = []
+        self.disposable_ids: List[str] = []
+        # Задержки успешных и неудачных ответов хранятся отдельно: быстрые
+        # 429/503 иначе занижали бы перцентили
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.error_latencies: Dict[str, List[float]] = defaultdict(list)
+
+    async def _timed(self, route: str, request, expected_status: int = 200):
+        started = time.perf_counter()
+        try:
+            resp = await request
+        except Exception:
+            resp = None
+        elapsed = time.perf_counter() - started
+        if resp is None or resp.status_code != expected_status:
+            self.error_latencies[route].append(elapsed)
+            return None
+        self.latencies[route].append(elapsed)
+        return resp
+
+    async def setup(self) -> None:
+        for _ in range(self.seed_users):
+            payload = _user_payload()
+            resp = await self.client.post("/user/", json=payload)
+            resp.raise_for_status()
+            self.users.append({**payload, "id": resp.json()["id"]})
+
+            resp = await self.client.post(
+                "/login/token",
+                data={"username": payload["email"], "password": PASSWORD},
+            )
+            resp.raise_for_status()
+            self.tokens.append(resp.json()["access_token"])
+
+    async def _run_one(self, route: str) -> None:
+        user = random.choice(self.users)
+        if route == "POST /login/token":
+            await self._timed(
+                route,
+                self.client.post(
+                    "/login/token",
+                    data={"username": user["email"], "password": PASSWORD},
+                ),
+            )
+        elif route == "GET /login/test_auth_endpoint":
+            token = random.choice(self.tokens)
+            await self._timed(
+                route,
+                self.client.get(
+                    "/login/test_auth_endpoint",
+                    headers={"Authorization": f"Bearer {token}"},
+                ),
+            )
+        elif route == "POST /user/":
+            resp = await self._timed(
+                route, self.client.post("/user/", json=_user_payload())
+            )
+            if resp is not None:
+                self.disposable_ids.append(resp.json()["id"])
+        elif route == "GET /user/":
+            await self._timed(route, self.client.get(f"/user/?user_id={user['id']}"))
+        elif route == "PATCH /user/":
+            await self._timed(
+                route,
+                self.client.patch(
+                    f"/user/?user_id={user['id']}",
+                    json={"first_name": random.choice(["load", "test", "bench"])},
+                ),
+            )
+        elif route == "DELETE /user/":
+            if not self.disposable_ids:
+                return
+            user_id = self.disposable_ids.pop()
+            await self._timed(route, self.client.delete(f"/user/?user_id={user_id}"))
+
+    async def _worker(self, deadline: float) -> None:
+        while time.perf_counter() < deadline:
+            route = random.choices(self.routes, weights=self.weights)[0]
+            await self._run_one(route)
+
+    async def run(self, duration: float, concurrency: int) -> float:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(self._worker(deadline) for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+    def report(self, elapsed: float) -> str:
+        """Таблица по маршрутам: rps и перцентили только по успешным ответам."""
+        lines = [
+            f"{'route':<32}{'count':>8}{'errors':>8}{'err %':>8}{'rps':>10}"
+            f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'err p50 ms':>12}"
+        ]
+        total = 0
+        total_errors = 0
+        for route in self.routes:
+            values = sorted(self.latencies[route])
+            errors = sorted(self.error_latencies[route])
+            total += len(values)
+            total_errors += len(errors)
+            lines.append(
+                f"{route:<32}{len(values):>8}{len(errors):>8}"
+                f"{error_rate(len(values), len(errors)):>8.1f}"
+                f"{len(values) / elapsed:>10.1f}"
+                f"{percentile(values, 50) * 1000:>10.2f}"
+                f"{percentile(values, 95) * 1000:>10.2f}"
+                f"{percentile(values, 99) * 1000:>10.2f}"
+                f"{percentile(errors, 50) * 1000:>12.2f}"
+            )
+        lines.append(
+            f"{'total':<32}{total:>8}{total_errors:>8}"
+            f"{error_rate(total, total_errors):>8.1f}{total / elapsed:>10.1f}"
+        )
+        return "\n".join(lines)
+
+
+async def main(
+    base_url: Optional[str], duration: float, concurrency: int, seed_users: int
+) -> None:
+    async with AsyncExitStack() as stack:
+        if base_url:
+            client = AsyncClient(base_url=base_url, timeout=30)
+        else:
+            from main import create_app
+
+            app = create_app()
+            app.state.services.login_rate_limiter = None
+            # ASGITransport не запускает lifespan, engine создается в нем
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = AsyncClient(
+                transport=ASGITransport(app=app),
+                base_url="http://loadtest",
+                timeout=30,
+            )
+
+        await stack.enter_async_context(client)
+        load_test = LoadTest(client, DEFAULT_MIX, seed_users=seed_users)
+        await load_test.setup()
+        elapsed = await load_test.run(duration=duration, concurrency=concurrency)
+        print(load_test.report(elapsed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default=None)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed-users", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.base_url, args.duration, args.concurrency, args.seed_users))
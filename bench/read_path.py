@@ -0,0 +1,77 @@
+# bench/read_path.py
+"""Сравнение стоимости чтения строки через ORM и через UserReadRepository.
+
+Нужна база из ``REAL_DATABASE_URL`` с примененными миграциями. Тестовые
+строки вставляются в транзакции, которая в конце откатывается.
+
+Пример::
+
+    python -m bench.read_path --rows 1000 --repeat 20
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy.dialects.postgresql import insert
+
+from db.models import User
+from db.repositories import UserReadRepository
+from db.repositories import UserRepository
+from db.session import Database
+from utils import settings
+
+
+async def _time_list_page(repository, rows: int, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        # Сессия не должна отдавать объекты из identity map прошлого прохода
+        repository.db_session.expunge_all()
+        started = time.perf_counter()
+        await repository.list_page(limit=rows)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+async def main(rows: int, repeat: int) -> None:
+    database = Database(settings)
+    async with database.async_session() as session:
+        try:
+            await session.execute(
+                insert(User).values(
+                    [
+                        dict(
+                            id=uuid.uuid4(),
+                            first_name="bench",
+                            last_name="bench",
+                            email=f"bench-{uuid.uuid4().hex}@test.com",
+                            hashed_password="hashed_password",
+                        )
+                        for _ in range(rows)
+                    ]
+                )
+            )
+
+            results = {}
+            for name, repository_class in (
+                ("orm", UserRepository),
+                ("core", UserReadRepository),
+            ):
+                seconds = await _time_list_page(repository_class(session), rows, repeat)
+                results[name] = seconds
+                print(
+                    f"{name:<6}{seconds * 1000:>10.2f} ms/page"
+                    f"{seconds / rows * 1e6:>10.2f} us/row"
+                )
+            print(f"speedup {results['orm'] / results['core']:.2f}x")
+        finally:
+            await session.rollback()
+    await database.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat))
@@ -0,0 +1,65 @@
+# bench/serialization.py
+"""Сравнение стоимости сериализации ответа GET /user/.
+
+Старый путь: копирование полей в UserResponse, повторная валидация через
+``response_model`` и ``jsonable_encoder`` + ``json.dumps`` в JSONResponse,
+как это делает FastAPI. Новый путь: ``user_to_dict`` и FastJSONResponse.
+
+Пример::
+
+    python -m bench.serialization --number 100000
+"""
+import argparse
+import timeit
+import uuid
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from api.responses import FastJSONResponse
+from api.responses import user_to_dict
+from api.schemas import UserResponse
+from db.models import User
+
+response_adapter = TypeAdapter(UserResponse)
+
+
+def legacy_path(user: User) -> bytes:
+    response = UserResponse(
+        id=user.id,
+        first_name=user.first_name,
+        last_name=user.last_name,
+        email=user.email,
+        is_active=user.is_active,
+    )
+    validated = response_adapter.validate_python(response, from_attributes=True)
+    content = jsonable_encoder(response_adapter.dump_python(validated, mode="json"))
+    return JSONResponse(content).body
+
+
+def fast_path(user: User) -> bytes:
+    return FastJSONResponse(user_to_dict(user)).body
+
+
+def main(number: int) -> None:
+    user = User(
+        id=uuid.uuid4(),
+        first_name="test",
+        last_name="test",
+        email="test@test.com",
+        is_active=True,
+        hashed_password="hashed_password",
+    )
+    assert legacy_path(user).replace(b" ", b"") == fast_path(user)
+
+    for name, func in (("legacy", legacy_path), ("fast", fast_path)):
+        seconds = min(timeit.repeat(lambda: func(user), number=number, repeat=5))
+        print(f"{name:<8}{seconds / number * 1e6:>10.2f} us/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+    main(args.number)
@@ -0,0 +1,87 @@
+# db/idempotency.py
+import asyncio
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from typing import Callable
+from typing import Optional
+
+from db.repositories import IdempotencyRepository
+from db.session import Database
+from utils.idempotency import IdempotencyBackend
+from utils.idempotency import StoredResponse
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class DatabaseIdempotencyBackend(IdempotencyBackend):
+    """Ответы в таблице idempotency_keys основной базы: видны всем воркерам.
+
+    ``get_database`` возвращает ``Database`` приложения: она создается в
+    lifespan, позже middleware. Захват - строка без ответа, живущая
+    ``claim_ttl`` секунд: если воркер упал, ключ освободится сам. Ожидающие
+    запросы опрашивают таблицу раз в ``poll_interval`` секунд. Просроченная
+    строка перезаписывается при повторном использовании ключа, остальные
+    удаляются при старте (``delete_expired`` в ``main.warm_up``).
+    """
+
+    def __init__(
+        self,
+        get_database: Callable[[], Database],
+        ttl: float,
+        claim_ttl: float,
+        poll_interval: float = 0.05,
+    ):
+        self.get_database = get_database
+        self.ttl = ttl
+        self.claim_ttl = claim_ttl
+        self.poll_interval = poll_interval
+
+    async def get(self, key: str) -> Optional[StoredResponse]:
+        # Основная база, не реплика: ответ должен быть виден сразу после записи
+        async with self.get_database().read_session_scope() as session:
+            row = await IdempotencyRepository(session).get(key)
+        if row is None:
+            return None
+        return StoredResponse(
+            fingerprint=row.fingerprint,
+            status=row.status,
+            headers=[
+                (name.encode("latin-1"), value.encode("latin-1"))
+                for name, value in row.headers
+            ],
+            body=row.body,
+        )
+
+    async def claim(self, key: str) -> bool:
+        async with self.get_database().autocommit_session_scope() as session:
+            return await IdempotencyRepository(session).claim(
+                key, expires_at=_now() + timedelta(seconds=self.claim_ttl)
+            )
+
+    async def set(self, key: str, response: StoredResponse) -> None:
+        async with self.get_database().autocommit_session_scope() as session:
+            await IdempotencyRepository(session).save(
+                key=key,
+                fingerprint=response.fingerprint,
+                status=response.status,
+                headers=[
+                    [name.decode("latin-1"), value.decode("latin-1")]
+                    for name, value in response.headers
+                ],
+                body=response.body,
+                expires_at=_now() + timedelta(seconds=self.ttl),
+            )
+
+    async def release(self, key: str) -> None:
+        async with self.get_database().autocommit_session_scope() as session:
+            await IdempotencyRepository(session).release(key)
+
+    async def wait(self, key: str) -> None:
+        await asyncio.sleep(self.poll_interval)
+
+    async def delete_expired(self) -> int:
+        async with self.get_database().autocommit_session_scope() as session:
+            return await IdempotencyRepository(session).delete_expired()
@@ -0,0 +1,151 @@
+# db/loaders.py
+import asyncio
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+from uuid import UUID
+
+from fastapi import Request
+
+from db.repositories import UserReadRepository
+from db.repositories import UserRecord
+from db.session import Database
+from db.session import reads_from_replica
+from utils import timing
+from utils.timing import RequestTimings
+
+
+class _Batch:
+    """Ключи одного вызова ``batch_fn`` и замеры времени всех ожидающих."""
+
+    __slots__ = ("futures", "waiters")
+
+    def __init__(self):
+        self.futures: Dict[Hashable, asyncio.Future] = {}
+        self.waiters: Dict[int, RequestTimings] = {}
+
+
+class BatchLoader:
+    """Собирает ключи, запрошенные в одном тике event loop, в один вызов.
+
+    Одинаковые ключи, уже ожидающие ответа, не запрашиваются повторно
+    (single-flight): все ожидающие получают результат одного запроса.
+
+    ``batch_fn`` выполняется в отдельной задаче, а не в запросе, который
+    первым попросил ключ. Его этапы (``db``, ``db-pool``) собираются
+    отдельно и добавляются к ``RequestTimings`` каждого ожидающего запроса.
+    """
+
+    def __init__(
+        self, batch_fn: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]
+    ):
+        self._batch_fn = batch_fn
+        self._pending = _Batch()
+        self._in_flight: Dict[Hashable, Tuple[asyncio.Future, _Batch]] = {}
+        self._tasks = set()
+        self._scheduled = False
+
+    async def load(self, key: Hashable) -> Optional[Any]:
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            future, batch = in_flight
+        else:
+            batch = self._pending
+            future = batch.futures.get(key)
+            if future is None:
+                loop = asyncio.get_running_loop()
+                future = loop.create_future()
+                batch.futures[key] = future
+                if not self._scheduled:
+                    self._scheduled = True
+                    loop.call_soon(self._dispatch)
+        timings = timing.current()
+        if timings is not None:
+            batch.waiters[id(timings)] = timings
+        # Отмена одного ожидающего не должна отменять общий запрос
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Optional[Any]]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self) -> None:
+        batch, self._pending = self._pending, _Batch()
+        self._scheduled = False
+        if not batch.futures:
+            return
+        for key, future in batch.futures.items():
+            self._in_flight[key] = (future, batch)
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: _Batch) -> None:
+        try:
+            with timing.collect() as batch_timings:
+                try:
+                    results = await self._batch_fn(list(batch.futures))
+                finally:
+                    for waiter in batch.waiters.values():
+                        waiter.merge(batch_timings)
+        except Exception as err:
+            for future in batch.futures.values():
+                if not future.done():
+                    future.set_exception(err)
+        else:
+            for key, future in batch.futures.items():
+                if not future.done():
+                    future.set_result(results.get(key))
+        finally:
+            for key in batch.futures:
+                self._in_flight.pop(key, None)
+
+
+class UserLoader:
+    """Объединяет одновременные get_by_id/get_by_email в запросы с ANY(...)."""
+
+    def __init__(self, session_scope: Callable):
+        self.session_scope = session_scope
+        self._by_id = BatchLoader(self._fetch_by_ids)
+        self._by_email = BatchLoader(self._fetch_by_emails)
+
+    async def load(self, user_id: UUID) -> Optional[UserRecord]:
+        return await self._by_id.load(user_id)
+
+    async def load_many(self, user_ids: Iterable[UUID]) -> List[Optional[UserRecord]]:
+        return await self._by_id.load_many(user_ids)
+
+    async def load_by_email(self, email: str) -> Optional[UserRecord]:
+        return await self._by_email.load(email)
+
+    async def _fetch_by_ids(self, user_ids: List[UUID]) -> Dict[UUID, UserRecord]:
+        async with self.session_scope() as session:
+            users = await UserReadRepository(session).get_many_by_ids(user_ids)
+        return {user.id: user for user in users}
+
+    async def _fetch_by_emails(self, emails: List[str]) -> Dict[str, UserRecord]:
+        async with self.session_scope() as session:
+            users = await UserReadRepository(session).get_many_by_emails(emails)
+        return {user.email: user for user in users}
+
+
+class UserLoaders:
+    """Loader'ы пользователей для основной базы и реплики одного процесса."""
+
+    def __init__(self, database: Database):
+        self.primary = UserLoader(database.read_session_scope)
+        self.replica: Optional[UserLoader] = None
+        if database.async_replica_session is not None:
+            self.replica = UserLoader(database.replica_session_scope)
+
+
+async def get_user_loader(request: Request) -> UserLoader:
+    loaders: UserLoaders = request.app.state.user_loaders
+    if loaders.replica is not None and reads_from_replica(request):
+        return loaders.replica
+    return loaders.primary
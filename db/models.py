@@ -3,7 +3,11 @@ import uuid
 
 from sqlalchemy import Boolean
 from sqlalchemy import Column
+from sqlalchemy import DateTime
+from sqlalchemy import Integer
+from sqlalchemy import LargeBinary
 from sqlalchemy import String
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import declarative_base
 
@@ -21,3 +25,21 @@ class User(Base):
     email = Column(String, nullable=False, unique=True)
     is_active = Column(Boolean(), default=True)
     hashed_password = Column(String, nullable=False)
+    # Увеличивается при удалении и смене email или пароля, отзывая токены
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Поиск по id и email идет по users_pkey и users_email_key: других
+    # индексов на users нет, чтобы не замедлять запись
+
+
+class IdempotencyKey(Base):
+    """Сохраненный ответ на запрос с Idempotency-Key, общий для воркеров."""
+
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    status = Column(Integer, nullable=False)
+    # Пары [имя, значение] заголовков ответа в latin-1
+    headers = Column(JSONB, nullable=False)
+    body = Column(LargeBinary, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
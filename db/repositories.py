@@ -1,14 +1,58 @@
 # db/repositories.py
+from datetime import datetime
+from typing import Any
+from typing import List
+from typing import NamedTuple
 from typing import Optional
 from uuid import UUID
 
 from sqlalchemy import and_
+from sqlalchemy import any_
+from sqlalchemy import bindparam
+from sqlalchemy import case
+from sqlalchemy import column
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import or_
 from sqlalchemy import select
+from sqlalchemy import String
 from sqlalchemy import update
+from sqlalchemy import values
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from db.models import IdempotencyKey
 from db.models import User
 
+# Изменение этих полей отзывает ранее выданные токены пользователя.
+# Кеш пользователей, отозванные версии токенов и фильтр занятых email
+# обновляет вызывающий код после COMMIT (api.login_handlers.forget_users),
+# а не репозиторий.
+TOKEN_REVOKING_FIELDS = ("email", "hashed_password")
+
+
+def revokes_tokens(changes: dict) -> bool:
+    """Отзывает ли изменение ``changes`` ранее выданные токены."""
+    return any(field in changes for field in TOKEN_REVOKING_FIELDS)
+
+
+class UserRecord(NamedTuple):
+    """Строка таблицы users без ORM: без identity map и инструментации."""
+
+    id: UUID
+    first_name: str
+    last_name: str
+    email: str
+    is_active: bool
+    hashed_password: str
+    token_version: int
+
+
+users_table = User.__table__
+user_record_columns = [users_table.c[field] for field in UserRecord._fields]
+
 
 class UserRepository:
     """Репозиторий для операций с пользователями в базе данных."""
@@ -18,30 +62,68 @@ class UserRepository:
 
     async def create(
         self, first_name: str, last_name: str, email: str, hashed_password: str
-    ) -> User:
-        """Создает нового пользователя."""
-        user = User(
-            first_name=first_name,
-            last_name=last_name,
-            email=email,
-            hashed_password=hashed_password,
-        )
-        self.db_session.add(user)
-        await self.db_session.flush()
-        return user
-
-    async def delete(self, user_id: UUID) -> Optional[UUID]:
-        """Удаляет пользователя."""
+    ) -> Optional[User]:
+        """Создает пользователя одним INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+        Возвращает None, если email уже занят.
+        """
+        query = (
+            insert(User)
+            .values(
+                first_name=first_name,
+                last_name=last_name,
+                email=email,
+                hashed_password=hashed_password,
+            )
+            .on_conflict_do_nothing(index_elements=[User.email])
+            .returning(User)
+        )
+        cursor = await self.db_session.scalars(query)
+        return cursor.one_or_none()
+
+    async def create_many(self, users: List[dict], chunk_size: int = 500) -> List[User]:
+        """Создает пользователей пачками, пропуская уже занятые email.
+
+        Каждая пачка вставляется одним ``INSERT ... ON CONFLICT DO NOTHING
+        RETURNING``; возвращаются только реально созданные пользователи.
+        """
+        created: List[User] = []
+        for start in range(0, len(users), chunk_size):
+            query = (
+                insert(User)
+                .values(users[start : start + chunk_size])
+                .on_conflict_do_nothing(index_elements=[User.email])
+                .returning(User)
+            )
+            cursor = await self.db_session.scalars(query)
+            created.extend(cursor.all())
+        return created
+
+    async def delete(self, user_id: UUID) -> Optional[User]:
+        """Удаляет пользователя и возвращает его последнее состояние."""
         query = (
             update(User)
             .where(and_(User.id == user_id, User.is_active == True))
-            .values(is_active=False)
-            .returning(User.id)
+            .values(is_active=False, token_version=User.token_version + 1)
+            .returning(User)
+            .execution_options(synchronize_session=False)
         )
 
-        cursor = await self.db_session.execute(query)
-        result = cursor.fetchone()
-        return result[0] if result else None
+        cursor = await self.db_session.scalars(query)
+        return cursor.one_or_none()
+
+    async def delete_many(self, user_ids: List[UUID]) -> List[User]:
+        """Удаляет пользователей одним UPDATE ... WHERE id = ANY(...)."""
+        ids = bindparam("ids", list(user_ids), type_=ARRAY(PG_UUID(as_uuid=True)))
+        query = (
+            update(User)
+            .where(and_(User.id == any_(ids), User.is_active == True))
+            .values(is_active=False, token_version=User.token_version + 1)
+            .returning(User)
+            .execution_options(synchronize_session=False)
+        )
+        cursor = await self.db_session.scalars(query)
+        return list(cursor.all())
 
     async def get_by_id(self, user_id: UUID) -> Optional[User]:
         """Получает пользователя по ID."""
@@ -57,14 +139,303 @@ class UserRepository:
         result = cursor.fetchone()
         return result[0] if result else None
 
-    async def update(self, user_id: UUID, **kwargs) -> Optional[UUID]:
-        """Обновляет данные пользователя."""
+    async def get_many_by_ids(self, user_ids: List[UUID]) -> List[User]:
+        """Получает активных пользователей по списку ID одним запросом."""
+        ids = bindparam("ids", list(user_ids), type_=ARRAY(PG_UUID(as_uuid=True)))
+        query = select(User).where(and_(User.id == any_(ids), User.is_active == True))
+        cursor = await self.db_session.scalars(query)
+        return list(cursor.all())
+
+    async def get_many_by_emails(self, emails: List[str]) -> List[User]:
+        """Получает активных пользователей по списку email одним запросом."""
+        emails_param = bindparam("emails", list(emails), type_=ARRAY(String))
+        query = select(User).where(
+            and_(User.email == any_(emails_param), User.is_active == True)
+        )
+        cursor = await self.db_session.scalars(query)
+        return list(cursor.all())
+
+    async def list_page(
+        self,
+        order_by: str = "id",
+        after: Optional[Any] = None,
+        limit: int = 50,
+        is_active: Optional[bool] = None,
+    ) -> List[User]:
+        """Получает страницу пользователей по ключу (keyset pagination).
+
+        Вместо OFFSET используется условие ``key > after``, поэтому глубокие
+        страницы читаются так же быстро, как первая.
+        """
+        key = getattr(User, order_by)
+        query = select(User).order_by(key).limit(limit)
+        if after is not None:
+            query = query.where(key > after)
+        if is_active is not None:
+            query = query.where(User.is_active == is_active)
+        cursor = await self.db_session.scalars(query)
+        return list(cursor.all())
+
+    async def set_password_hash(self, user_id: UUID, hashed_password: str) -> None:
+        """Перезаписывает хеш того же пароля, например с новой стоимостью.
+
+        Пароль не меняется, поэтому токены пользователя не отзываются.
+        """
+        query = (
+            update(User)
+            .where(User.id == user_id)
+            .values(hashed_password=hashed_password)
+            .execution_options(synchronize_session=False)
+        )
+        await self.db_session.execute(query)
+
+    async def update_many(self, changes: List[dict]) -> List[User]:
+        """Обновляет пользователей одним UPDATE ... FROM (VALUES ...).
+
+        Каждый элемент ``changes`` содержит ``id`` и изменяемые поля;
+        отсутствующие поля остаются прежними.
+        """
+        rows = values(
+            column("id", PG_UUID(as_uuid=True)),
+            column("first_name", String),
+            column("last_name", String),
+            column("email", String),
+            name="changes",
+        ).data(
+            [
+                (
+                    change["id"],
+                    change.get("first_name"),
+                    change.get("last_name"),
+                    change.get("email"),
+                )
+                for change in changes
+            ]
+        )
+        query = (
+            update(User)
+            .where(and_(User.id == rows.c.id, User.is_active == True))
+            .values(
+                first_name=func.coalesce(rows.c.first_name, User.first_name),
+                last_name=func.coalesce(rows.c.last_name, User.last_name),
+                email=func.coalesce(rows.c.email, User.email),
+                # Смена email отзывает токены, как и в update()
+                token_version=User.token_version
+                + case((rows.c.email.is_not(None), 1), else_=0),
+            )
+            .returning(User)
+            .execution_options(synchronize_session=False)
+        )
+        cursor = await self.db_session.scalars(query)
+        return list(cursor.all())
+
+    async def update(self, user_id: UUID, **kwargs) -> Optional[User]:
+        """Обновляет данные пользователя и возвращает его новое состояние."""
+        if revokes_tokens(kwargs):
+            kwargs["token_version"] = User.token_version + 1
         query = (
             update(User)
             .where(and_(User.is_active == True, User.id == user_id))
             .values(kwargs)
-            .returning(User.id)
+            .returning(User)
+            .execution_options(synchronize_session=False)
         )
+        cursor = await self.db_session.scalars(query)
+        return cursor.one_or_none()
+
+
+class UserReadRepository:
+    """Чтение пользователей через Core-запросы.
+
+    Интерфейс чтения совпадает с UserRepository, но вместо ORM-объектов
+    возвращаются UserRecord: строки не попадают в identity map сессии.
+    """
+
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    async def _fetch(self, query) -> List[UserRecord]:
         cursor = await self.db_session.execute(query)
-        result = cursor.fetchone()
-        return result[0] if result else None
+        return [UserRecord._make(row) for row in cursor.fetchall()]
+
+    async def _fetch_one(self, query) -> Optional[UserRecord]:
+        cursor = await self.db_session.execute(query)
+        row = cursor.fetchone()
+        return UserRecord._make(row) if row else None
+
+    async def get_by_id(self, user_id: UUID) -> Optional[UserRecord]:
+        """Получает пользователя по ID."""
+        query = select(*user_record_columns).where(
+            and_(users_table.c.id == user_id, users_table.c.is_active == True)
+        )
+        return await self._fetch_one(query)
+
+    async def get_by_email(self, email: str) -> Optional[UserRecord]:
+        """Получает пользователя по email."""
+        query = select(*user_record_columns).where(
+            and_(users_table.c.email == email, users_table.c.is_active == True)
+        )
+        return await self._fetch_one(query)
+
+    async def email_exists(self, email: str) -> bool:
+        """Занят ли email, в том числе удаленным пользователем."""
+        query = select(users_table.c.id).where(users_table.c.email == email).limit(1)
+        cursor = await self.db_session.execute(query)
+        return cursor.first() is not None
+
+    async def existing_emails(self, emails: List[str]) -> List[str]:
+        """Какие из ``emails`` заняты, в том числе удаленными пользователями."""
+        emails_param = bindparam("emails", list(emails), type_=ARRAY(String))
+        query = select(users_table.c.email).where(
+            users_table.c.email == any_(emails_param)
+        )
+        cursor = await self.db_session.execute(query)
+        return list(cursor.scalars().all())
+
+    async def emails_page(self, after: Optional[str], limit: int) -> List[str]:
+        """Следующие ``limit`` email по порядку (по уникальному индексу)."""
+        query = select(users_table.c.email).order_by(users_table.c.email).limit(limit)
+        if after is not None:
+            query = query.where(users_table.c.email > after)
+        cursor = await self.db_session.execute(query)
+        return list(cursor.scalars().all())
+
+    async def get_many_by_ids(self, user_ids: List[UUID]) -> List[UserRecord]:
+        """Получает активных пользователей по списку ID одним запросом."""
+        ids = bindparam("ids", list(user_ids), type_=ARRAY(PG_UUID(as_uuid=True)))
+        query = select(*user_record_columns).where(
+            and_(users_table.c.id == any_(ids), users_table.c.is_active == True)
+        )
+        return await self._fetch(query)
+
+    async def get_many_by_emails(self, emails: List[str]) -> List[UserRecord]:
+        """Получает активных пользователей по списку email одним запросом."""
+        emails_param = bindparam("emails", list(emails), type_=ARRAY(String))
+        query = select(*user_record_columns).where(
+            and_(
+                users_table.c.email == any_(emails_param),
+                users_table.c.is_active == True,
+            )
+        )
+        return await self._fetch(query)
+
+    async def list_page(
+        self,
+        order_by: str = "id",
+        after: Optional[Any] = None,
+        limit: int = 50,
+        is_active: Optional[bool] = None,
+    ) -> List[UserRecord]:
+        """Получает страницу пользователей по ключу (keyset pagination)."""
+        key = users_table.c[order_by]
+        query = select(*user_record_columns).order_by(key).limit(limit)
+        if after is not None:
+            query = query.where(key > after)
+        if is_active is not None:
+            query = query.where(users_table.c.is_active == is_active)
+        return await self._fetch(query)
+
+
+idempotency_keys_table = IdempotencyKey.__table__
+
+
+class IdempotencyRepository:
+    """Ответы по ключам идемпотентности в таблице idempotency_keys.
+
+    Строка со статусом ``PENDING_STATUS`` - захват ключа выполняющимся
+    запросом: ответа в ней еще нет.
+    """
+
+    PENDING_STATUS = 0
+
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Строка с непросроченным ответом или None."""
+        table = idempotency_keys_table
+        query = select(
+            table.c.fingerprint, table.c.status, table.c.headers, table.c.body
+        ).where(
+            and_(
+                table.c.key == key,
+                table.c.status != self.PENDING_STATUS,
+                table.c.expires_at > func.now(),
+            )
+        )
+        cursor = await self.db_session.execute(query)
+        return cursor.fetchone()
+
+    async def claim(self, key: str, expires_at: datetime) -> bool:
+        """Захватывает ключ; False, если его держит другой запрос или есть ответ.
+
+        Просроченная строка (в том числе захват упавшего воркера)
+        перезаписывается.
+        """
+        row = {
+            "fingerprint": "",
+            "status": self.PENDING_STATUS,
+            "headers": [],
+            "body": b"",
+            "expires_at": expires_at,
+        }
+        query = (
+            insert(IdempotencyKey)
+            .values(key=key, **row)
+            .on_conflict_do_update(
+                index_elements=[IdempotencyKey.key],
+                set_=row,
+                where=idempotency_keys_table.c.expires_at <= func.now(),
+            )
+            .returning(idempotency_keys_table.c.key)
+        )
+        cursor = await self.db_session.execute(query)
+        return cursor.first() is not None
+
+    async def save(
+        self,
+        key: str,
+        fingerprint: str,
+        status: int,
+        headers: List[List[str]],
+        body: bytes,
+        expires_at: datetime,
+    ) -> None:
+        """Сохраняет ответ поверх захвата или просроченной строки."""
+        table = idempotency_keys_table
+        row = {
+            "fingerprint": fingerprint,
+            "status": status,
+            "headers": headers,
+            "body": body,
+            "expires_at": expires_at,
+        }
+        query = (
+            insert(IdempotencyKey)
+            .values(key=key, **row)
+            .on_conflict_do_update(
+                index_elements=[IdempotencyKey.key],
+                set_=row,
+                where=or_(
+                    table.c.status == self.PENDING_STATUS,
+                    table.c.expires_at <= func.now(),
+                ),
+            )
+        )
+        await self.db_session.execute(query)
+
+    async def release(self, key: str) -> None:
+        """Снимает захват, если ответ так и не был сохранен."""
+        table = idempotency_keys_table
+        query = delete(IdempotencyKey).where(
+            and_(table.c.key == key, table.c.status == self.PENDING_STATUS)
+        )
+        await self.db_session.execute(query)
+
+    async def delete_expired(self) -> int:
+        """Удаляет просроченные ответы и возвращает их число."""
+        query = delete(IdempotencyKey).where(
+            idempotency_keys_table.c.expires_at <= func.now()
+        )
+        cursor = await self.db_session.execute(query)
+        return cursor.rowcount
@@ -1,17 +1,355 @@
 # db/session.py
+import math
+import time
+from logging import getLogger
+from typing import Callable
+from typing import List
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.datastructures import MutableHeaders
+
+from utils import timing
+from utils.metrics import db_pool_checked_out
+from utils.metrics import db_pool_overflow
+from utils.metrics import db_pool_wait_seconds
+
+logger = getLogger(__name__)
+
+# Время последней записи клиента в основную базу (unix time, секунды)
+READ_YOUR_WRITES_COOKIE = "db_written_at"
+
+
+class DatabaseBusyError(Exception):
+    """Слишком много запросов ожидают соединения с базой данных."""
+
+
+class AdmissionController:
+    """Ограничивает число соединений пула, занятых или ожидаемых одновременно.
+
+    Лимит равен размеру пула с overflow плюс допустимая очередь ожидающих.
+    Checkout сверх лимита сразу отклоняется, а не висит до таймаута
+    клиента. Слот занят, только пока запрос ждет соединение или держит
+    его: хеширование пароля и прочая работа без базы слот не занимают.
+    Занятые соединения считает сам пул (``checked_out``), здесь - только
+    ожидающие.
+    """
+
+    def __init__(self, limit: int, checked_out: Callable[[], int] = lambda: 0):
+        self.limit = limit
+        self.checked_out = checked_out
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self.checked_out() + self.waiting
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            return False
+        self.waiting += 1
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        self.waiting -= 1
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул с допуском к checkout и замером его времени в ``db-pool``.
+
+    У пула есть событие ``checkout``, но нет события перед ожиданием,
+    поэтому допуск (``admission``) и время ожидания обрабатываются в
+    ``connect``, через который engine берет каждое соединение.
+    ``database_label`` - метка пула в метриках Prometheus.
+    """
+
+    database_label = "primary"
+    admission: Optional[AdmissionController] = None
+
+    def connect(self):
+        admission = self.admission
+        if admission is not None and not admission.try_acquire():
+            raise DatabaseBusyError(
+                f"Too many requests waiting for a database connection "
+                f"({admission.in_flight}/{admission.limit})"
+            )
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            if admission is not None:
+                admission.release()
+            elapsed = time.perf_counter() - started
+            timing.record("db-pool", elapsed)
+            db_pool_wait_seconds.labels(self.database_label).observe(elapsed)
+
+    def recreate(self) -> "TimedQueuePool":
+        pool = super().recreate()
+        pool.database_label = self.database_label
+        pool.admission = self.admission
+        return pool
+
+
+def instrument_pool(engine: AsyncEngine, database_label: str) -> None:
+    """Обновляет метрики занятых и overflow соединений при checkout/checkin."""
+    sync_engine = engine.sync_engine
+    sync_engine.pool.database_label = database_label
+    checked_out = db_pool_checked_out.labels(database_label)
+    overflow = db_pool_overflow.labels(database_label)
+
+    def update(*args) -> None:
+        # engine.dispose() заменяет пул, поэтому берем текущий
+        pool = sync_engine.pool
+        checked_out.set(pool.checkedout())
+        # До заполнения пула QueuePool.overflow() отрицателен
+        overflow.set(max(pool.overflow(), 0))
+
+    event.listen(sync_engine, "checkout", update)
+    event.listen(sync_engine, "checkin", update)
+
+
+def instrument_engine(engine: AsyncEngine, slow_query_ms: float = 0.0) -> None:
+    """Учитывает каждый запрос к базе в ``db`` текущего запроса.
+
+    Число запросов и их суммарное время попадают в ``RequestTimings``.
+    Запросы не короче ``slow_query_ms`` пишутся в лог (0 - не писать);
+    параметры не логируются, в них бывают хеши паролей.
+    """
+
+    def finish(conn, statement: str) -> None:
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        timing.record("db", elapsed)
+        if slow_query_ms and elapsed * 1000 >= slow_query_ms:
+            logger.warning(
+                "slow query",
+                extra={"duration_ms": round(elapsed * 1000, 2), "statement": statement},
+            )
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        finish(conn, statement)
+
+    def handle_error(context):
+        # after_cursor_execute не вызывается, если запрос упал
+        connection = context.connection
+        if connection is not None and connection.info.get("query_started"):
+            finish(connection, context.statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine.sync_engine, "handle_error", handle_error)
+
+
+class Database:
+    """Engine'ы, фабрики сессий и лимиты пула одного процесса.
+
+    Создается в lifespan приложения (см. ``main.create_app``), то есть уже
+    в воркере после fork, и закрывается при остановке.
+    """
 
-from utils import settings
+    def __init__(self, settings):
+        self.engine = self._create_engine(
+            settings.REAL_DATABASE_URL, settings, database_label="primary"
+        )
+        self.async_session = sessionmaker(
+            self.engine, expire_on_commit=False, class_=AsyncSession
+        )
 
-engine = create_async_engine(settings.REAL_DATABASE_URL, future=True, echo=True)
-async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+        # Чтения и записи одним запросом (INSERT/UPDATE ... RETURNING) не
+        # нуждаются в BEGIN/COMMIT: в режиме AUTOCOMMIT соединение берется из
+        # пула при первом запросе и возвращается при закрытии сессии. Пул
+        # общий с основным engine.
+        self.async_autocommit_session = sessionmaker(
+            self.engine.execution_options(isolation_level="AUTOCOMMIT"),
+            expire_on_commit=False,
+            class_=AsyncSession,
+        )
+        self.admission = self._admit(
+            self.engine,
+            limit=settings.DB_POOL_SIZE
+            + settings.DB_MAX_OVERFLOW
+            + settings.DB_MAX_WAITING,
+        )
 
+        # Необязательная реплика: get_read_db отправляет чтения туда, кроме
+        # клиентов, которые недавно писали в основную базу (cookie
+        # READ_YOUR_WRITES_COOKIE, см. ReadYourWritesMiddleware).
+        self.replica_engine: Optional[AsyncEngine] = None
+        self.async_replica_session: Optional[sessionmaker] = None
+        if settings.REPLICA_DATABASE_URL:
+            self.replica_engine = self._create_engine(
+                settings.REPLICA_DATABASE_URL, settings, database_label="replica"
+            )
+            self.async_replica_session = sessionmaker(
+                self.replica_engine.execution_options(isolation_level="AUTOCOMMIT"),
+                expire_on_commit=False,
+                class_=AsyncSession,
+            )
+        self.replica_admission = AdmissionController(limit=self.admission.limit)
+        if self.replica_engine is not None:
+            self.replica_admission = self._admit(
+                self.replica_engine, limit=self.admission.limit
+            )
+        self.read_your_writes_seconds = settings.READ_YOUR_WRITES_SECONDS
 
-async def get_db():
+    @staticmethod
+    def _create_engine(url: str, settings, database_label: str) -> AsyncEngine:
+        engine = create_async_engine(
+            url,
+            future=True,
+            echo=settings.DB_ECHO,
+            poolclass=TimedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+        instrument_engine(engine, slow_query_ms=settings.DB_SLOW_QUERY_MS)
+        instrument_pool(engine, database_label)
+        return engine
+
+    @staticmethod
+    def _admit(engine: AsyncEngine, limit: int) -> AdmissionController:
+        sync_engine = engine.sync_engine
+        # engine.dispose() заменяет пул, поэтому считаем по текущему
+        admission = AdmissionController(
+            limit=limit, checked_out=lambda: sync_engine.pool.checkedout()
+        )
+        sync_engine.pool.admission = admission
+        return admission
+
+    @property
+    def engines(self) -> List[AsyncEngine]:
+        if self.replica_engine is None:
+            return [self.engine]
+        return [self.engine, self.replica_engine]
+
+    # AsyncSession не берет соединение из пула до первого запроса и
+    # возвращает его при закрытии; допуск проверяет пул при checkout
+    def session_scope(self) -> AsyncSession:
+        return self.async_session()
+
+    def read_session_scope(self) -> AsyncSession:
+        return self.async_autocommit_session()
+
+    def autocommit_session_scope(self) -> AsyncSession:
+        """Для записи одним запросом; несколько запросов - session_scope."""
+        return self.async_autocommit_session()
+
+    def replica_session_scope(self) -> AsyncSession:
+        return self.async_replica_session()
+
+    async def dispose(self) -> None:
+        for engine in self.engines:
+            await engine.dispose()
+
+
+class ReadYourWritesMiddleware:
+    """Отдает клиенту, который писал в основную базу, cookie со временем записи.
+
+    get_db и get_autocommit_db отмечают запрос в ``request.state``, а по
+    cookie из следующих запросов get_read_db в течение ``max_age`` секунд
+    читает из основной базы. Время хранится у клиента, а не в памяти
+    процесса, поэтому работает с любым числом воркеров и не зависит от IP
+    клиента за прокси.
+    """
+
+    def __init__(self, app, max_age: float):
+        self.app = app
+        self.max_age = max_age
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start":
+                written_at = scope.get("state", {}).get(READ_YOUR_WRITES_COOKIE)
+                if written_at is not None:
+                    MutableHeaders(scope=message).append(
+                        "Set-Cookie",
+                        f"{READ_YOUR_WRITES_COOKIE}={written_at:.3f}; "
+                        f"Max-Age={math.ceil(self.max_age)}; Path=/; "
+                        "HttpOnly; SameSite=Lax",
+                    )
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+def get_database(request: Request) -> Database:
+    return request.app.state.db
+
+
+def _recently_wrote(request: Request, window: float) -> bool:
     try:
-        session: AsyncSession = async_session()
+        written_at = float(request.cookies.get(READ_YOUR_WRITES_COOKIE, ""))
+    except ValueError:
+        return False
+    # Время из будущего (чужие часы или подделка) не считается записью
+    return 0 <= time.time() - written_at < window
+
+
+def reads_from_replica(request: Request) -> bool:
+    """Можно ли читать с реплики для клиента этого запроса."""
+    database = get_database(request)
+    return database.async_replica_session is not None and not _recently_wrote(
+        request, database.read_your_writes_seconds
+    )
+
+
+def _mark_written(request: Request, database: Database) -> None:
+    # Клиент, который пишет, какое-то время читает из основной базы
+    if database.async_replica_session is not None:
+        setattr(request.state, READ_YOUR_WRITES_COOKIE, time.time())
+
+
+async def get_db(request: Request):
+    database = get_database(request)
+    _mark_written(request, database)
+    async with database.session_scope() as session:
+        yield session
+
+
+async def get_autocommit_db(request: Request):
+    """Сессия основной базы в AUTOCOMMIT для записи одним запросом.
+
+    INSERT/UPDATE ... RETURNING стоит одного обращения к базе вместо трех
+    (BEGIN, запрос, COMMIT). Записи из нескольких запросов должны быть
+    атомарными и идут через get_db.
+    """
+    database = get_database(request)
+    _mark_written(request, database)
+    async with database.autocommit_session_scope() as session:
+        yield session
+
+
+async def get_read_db(request: Request):
+    """Сессия для чтения без явной транзакции (AUTOCOMMIT).
+
+    Если настроена реплика, чтение идет туда, кроме клиентов, писавших в
+    последние READ_YOUR_WRITES_SECONDS (по cookie READ_YOUR_WRITES_COOKIE). Не использовать для записи и для
+    чтений, которым нужен согласованный снимок из нескольких запросов.
+    """
+    database = get_database(request)
+    if reads_from_replica(request):
+        async with database.replica_session_scope() as session:
+            yield session
+        return
+
+    async with database.read_session_scope() as session:
         yield session
-    finally:
-        await session.close()
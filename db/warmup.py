@@ -0,0 +1,79 @@
+# db/warmup.py
+import uuid
+from contextlib import AsyncExitStack
+from logging import getLogger
+from typing import Callable
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.repositories import UserReadRepository
+from db.repositories import UserRepository
+from utils.bloom import BloomFilter
+
+logger = getLogger(__name__)
+
+
+async def _prepare_statements(connection: AsyncConnection, read_only: bool) -> None:
+    """Выполняет запросы репозиториев с заведомо пустым результатом.
+
+    SQLAlchemy кладет скомпилированные запросы в кеш engine, а asyncpg
+    готовит prepared statements на этом соединении. Запись идет в
+    транзакции, которая откатывается; с ``read_only`` (реплика в режиме
+    hot standby отклоняет UPDATE даже без подходящих строк) - только чтения.
+    """
+    missing_id = uuid.uuid4()
+    missing_email = f"warmup-{missing_id.hex}@invalid"
+    async with AsyncSession(bind=connection) as session:
+        try:
+            read_repository = UserReadRepository(session)
+            await read_repository.get_by_id(missing_id)
+            await read_repository.get_by_email(missing_email)
+            await read_repository.email_exists(missing_email)
+            await read_repository.existing_emails([missing_email])
+            await read_repository.get_many_by_ids([missing_id])
+            await read_repository.get_many_by_emails([missing_email])
+            await read_repository.list_page(limit=1)
+            if read_only:
+                return
+
+            repository = UserRepository(session)
+            await repository.update(missing_id, first_name="warmup")
+            await repository.delete(missing_id)
+        finally:
+            await session.rollback()
+
+
+async def warm_up_engine(
+    engine: AsyncEngine, connections: int, read_only: bool = False
+) -> None:
+    """Открывает ``connections`` соединений одновременно и прогревает каждое.
+
+    Соединения держатся до конца прогрева, чтобы пул действительно создал
+    их все, а затем возвращаются в пул.
+    """
+    async with AsyncExitStack() as stack:
+        opened = []
+        for _ in range(connections):
+            opened.append(await stack.enter_async_context(engine.connect()))
+        for connection in opened:
+            await _prepare_statements(connection, read_only)
+    logger.info("Warmed up %s database connections", connections)
+
+
+async def load_taken_emails(
+    session_scope: Callable, bloom: BloomFilter, chunk_size: int
+) -> None:
+    """Добавляет в фильтр все email из users, страницами по индексу email."""
+    after: Optional[str] = None
+    while True:
+        async with session_scope() as session:
+            emails = await UserReadRepository(session).emails_page(after, chunk_size)
+        for email in emails:
+            bloom.add(email)
+        if len(emails) < chunk_size:
+            break
+        after = emails[-1]
+    logger.info("Loaded %s taken emails into the Bloom filter", bloom.count)
@@ -1,23 +1,273 @@
 # main.py
-import uvicorn
+import argparse
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from contextlib import suppress
+from logging import getLogger
+from typing import List
+from typing import Optional
+
 from fastapi import FastAPI
+from fastapi import Request
+from fastapi.responses import JSONResponse
 from fastapi.routing import APIRouter
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
+from api.health_handlers import health_router
 from api.login_handlers import login_router
+from api.metrics_handlers import metrics_router
 from api.user_handlers import user_router
+from db.idempotency import DatabaseIdempotencyBackend
+from db.loaders import UserLoaders
+from db.session import Database
+from db.session import DatabaseBusyError
+from db.session import ReadYourWritesMiddleware
+from db.warmup import load_taken_emails
+from db.warmup import warm_up_engine
+from utils import settings as default_settings
+from utils.hasher import HasherOverloadedError
+from utils.idempotency import IdempotencyMiddleware
+from utils.metrics import mark_process_dead
+from utils.metrics import MetricsMiddleware
+from utils.metrics import prepare_multiprocess_dir
+from utils.services import Services
+from utils.timing import ServerTimingMiddleware
+
+logger = getLogger(__name__)
+
+
+async def _until_success(step: str, make_step, delay: float) -> None:
+    while True:
+        try:
+            return await make_step()
+        except Exception:
+            logger.exception("Warm-up of %s failed, retrying in %s s", step, delay)
+            await asyncio.sleep(delay)
+
+
+async def warm_up(app: FastAPI, settings) -> None:
+    """Прогревает пул, хешер и фильтр занятых email, затем отмечает готовность.
+
+    Готовность отмечается, только когда закончились все шаги. Основной пул
+    прогревается, пока не получится: без основной базы приложение не
+    обслужит ни одного запроса, и /health/ready до тех пор отвечает 503.
+    Остальные шаги только ускоряют первые запросы: упавший шаг пишется в
+    лог и не мешает готовности.
+    """
+    database: Database = app.state.db
+    services: Services = app.state.services
+    steps = {
+        "primary pool": _until_success(
+            "primary pool",
+            lambda: warm_up_engine(
+                database.engine, settings.DB_POOL_WARMUP_CONNECTIONS
+            ),
+            delay=settings.DB_POOL_WARMUP_RETRY_SECONDS,
+        ),
+        "hasher": services.hasher.warm_up(),
+        "taken emails": load_taken_emails(
+            database.read_session_scope,
+            services.taken_emails,
+            settings.EMAIL_BLOOM_LOAD_CHUNK_SIZE,
+        ),
+    }
+    if isinstance(services.idempotency_backend, DatabaseIdempotencyBackend):
+        steps["expired idempotency keys"] = (
+            services.idempotency_backend.delete_expired()
+        )
+    if database.replica_engine is not None:
+        steps["replica pool"] = warm_up_engine(
+            database.replica_engine,
+            settings.DB_POOL_WARMUP_CONNECTIONS,
+            read_only=True,
+        )
+    results = await asyncio.gather(*steps.values(), return_exceptions=True)
+    for step, result in zip(steps, results):
+        if isinstance(result, BaseException):
+            logger.error("Warm-up of %s failed", step, exc_info=result)
+    app.state.ready = True
+
+
+def attach_database(app: FastAPI, database: Database) -> None:
+    """Подключает базу к приложению: lifespan при старте, тесты - сами."""
+    app.state.db = database
+    app.state.user_loaders = UserLoaders(database)
+
+
+# Быстрый отказ с 503, когда пул соединений перегружен
+async def database_busy_handler(request: Request, exc: Exception) -> JSONResponse:
+    logger.warning(exc)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database is busy, try again later"},
+        headers={"Retry-After": str(request.app.state.settings.DB_RETRY_AFTER_SECONDS)},
+    )
+
+
+# Очередь хеширования полна: повторить позже дешевле, чем ждать в ней
+async def hasher_overloaded_handler(request: Request, exc: Exception) -> JSONResponse:
+    logger.warning(exc)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, try again later"},
+        headers={
+            "Retry-After": str(request.app.state.settings.HASHER_RETRY_AFTER_SECONDS)
+        },
+    )
+
+
+def create_app(settings=default_settings) -> FastAPI:
+    """Создает приложение; engine создается только при старте lifespan.
+
+    Хешер, кеши, лимиты и фильтры строятся здесь из ``settings`` и лежат в
+    ``app.state.services``.
+    """
+    services = Services(settings)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        database = Database(settings)
+        attach_database(app, database)
+
+        # Прогрев идет в фоне: /health/live отвечает сразу, /health/ready
+        # возвращает 503, пока прогрев не закончится
+        app.state.ready = False
+        warm_up_task = asyncio.create_task(warm_up(app, settings))
+        try:
+            yield
+        finally:
+            # Прогрев должен остановиться до закрытия пула, которым он пользуется
+            warm_up_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await warm_up_task
+            await database.dispose()
+            services.hasher.shutdown()
+            mark_process_dead()
+
+    # Создание экземпляра FastAPI приложения
+    app = FastAPI(title="space", lifespan=lifespan)
+    app.state.settings = settings
+    app.state.services = services
+    if settings.IDEMPOTENCY_BACKEND == "database":
+        services.idempotency_backend = DatabaseIdempotencyBackend(
+            lambda: app.state.db,
+            ttl=settings.IDEMPOTENCY_TTL_SECONDS,
+            claim_ttl=settings.IDEMPOTENCY_CLAIM_SECONDS,
+        )
+
+    # Создание главного роутера API
+    main_api_router = APIRouter()
+
+    # Подключение пользовательского роутера к главному
+    main_api_router.include_router(login_router, prefix="/login", tags=["login"])
+    main_api_router.include_router(user_router, prefix="/user", tags=["user"])
+    main_api_router.include_router(health_router, prefix="/health", tags=["health"])
+
+    # Подключение главного роутера к приложению
+    app.include_router(main_api_router)
+    app.include_router(metrics_router)
+
+    app.add_exception_handler(DatabaseBusyError, database_busy_handler)
+    app.add_exception_handler(PoolTimeoutError, database_busy_handler)
+    app.add_exception_handler(HasherOverloadedError, hasher_overloaded_handler)
+
+    # Повтор по Idempotency-Key не доходит до обработчика: без хеширования
+    # пароля и без запросов к базе
+    app.add_middleware(
+        IdempotencyMiddleware,
+        routes={
+            ("POST", "/user/"): services.idempotency_backend,
+            ("POST", "/login/token"): services.login_idempotency_backend,
+        },
+        secret_key=settings.SECRET_KEY,
+        max_body_bytes=settings.IDEMPOTENCY_MAX_BODY_BYTES,
+    )
+    if settings.REPLICA_DATABASE_URL:
+        app.add_middleware(
+            ReadYourWritesMiddleware, max_age=settings.READ_YOUR_WRITES_SECONDS
+        )
+    if settings.SERVER_TIMING_ENABLED:
+        app.add_middleware(
+            ServerTimingMiddleware,
+            log_min_ms=settings.SERVER_TIMING_LOG_MIN_MS,
+            query_count_header=settings.SERVER_TIMING_QUERY_COUNT_HEADER,
+        )
+    # Добавлен последним, поэтому внешний: задержка включает все middleware
+    app.add_middleware(MetricsMiddleware)
+    return app
+
+
+app = create_app()
+
+
+def run(argv: Optional[List[str]] = None) -> None:
+    """Запускает uvicorn с одним или несколькими воркерами.
+
+    Каждый воркер импортирует ``main:app`` сам, поэтому engine и пул
+    создаются в нем после fork. По SIGTERM uvicorn перестает принимать
+    соединения, ждет текущие запросы до ``--graceful-timeout`` секунд, затем
+    lifespan закрывает пул.
+    """
+    import uvicorn
 
-# Создание экземпляра FastAPI приложения
-app = FastAPI(title="space")
+    parser = argparse.ArgumentParser(description="Запуск API")
+    parser.add_argument("--host", default=default_settings.WEB_HOST)
+    parser.add_argument("--port", type=int, default=default_settings.WEB_PORT)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=default_settings.WEB_WORKERS,
+        help="число процессов, 0 - по числу ядер",
+    )
+    parser.add_argument(
+        "--loop",
+        choices=["auto", "asyncio", "uvloop"],
+        default=default_settings.WEB_LOOP,
+    )
+    parser.add_argument(
+        "--http",
+        choices=["auto", "h11", "httptools"],
+        default=default_settings.WEB_HTTP,
+    )
+    parser.add_argument(
+        "--graceful-timeout",
+        type=int,
+        default=default_settings.WEB_GRACEFUL_SHUTDOWN_SECONDS,
+    )
+    args = parser.parse_args(argv)
 
-# Создание главного роутера API
-main_api_router = APIRouter()
+    workers = args.workers or os.cpu_count()
+    if default_settings.TOKEN_STATELESS and workers > 1:
+        # Отзыв токена, сделанный одним воркером, другие бы не увидели
+        parser.error("TOKEN_STATELESS requires a single worker (--workers 1)")
+    if default_settings.IDEMPOTENCY_BACKEND == "memory" and workers > 1:
+        # Повтор, попавший в другой воркер, выполнился бы второй раз
+        parser.error(
+            "IDEMPOTENCY_BACKEND=memory requires a single worker, "
+            "use IDEMPOTENCY_BACKEND=database"
+        )
+    if workers > 1 and not default_settings.IDEMPOTENCY_BACKEND:
+        # Воркеры наследуют окружение и читают его при импорте main
+        os.environ["IDEMPOTENCY_BACKEND"] = "database"
+    if workers > 1:
+        # Сброс кеша пользователей после изменения виден только своему
+        # воркеру, остальные отдавали бы старую запись до конца TTL
+        os.environ["PRINCIPAL_CACHE_SIZE"] = "0"
+    if workers > 1:
+        # Воркеры запускаются через spawn и видят каталог при импорте метрик
+        prepare_multiprocess_dir()
 
-# Подключение пользовательского роутера к главному
-main_api_router.include_router(login_router, prefix="/login", tags=["login"])
-main_api_router.include_router(user_router, prefix="/user", tags=["user"])
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop=args.loop,
+        http=args.http,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
 
-# Подключение главного роутера к приложению
-app.include_router(main_api_router)
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    run()
@@ -1,33 +1,33 @@
 # tests/conftest.py
 import os
+from contextlib import contextmanager
+from types import SimpleNamespace
 from typing import AsyncGenerator
+from typing import List
+from typing import Optional
 
 import asyncpg
 import pytest
 import pytest_asyncio
 from httpx import ASGITransport
 from httpx import AsyncClient
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.ext.asyncio import create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import event
 
 import utils.settings as settings
-from db.session import get_db
-from main import app
+from db.session import Database
+from main import attach_database
+from main import create_app
 
 
 CLEAN_TABLES = [
     "users",
+    "idempotency_keys",
 ]
 
 
 @pytest.fixture(scope="session", autouse=True)
 def run_migrations():
-    if not os.path.exists("migrations"):
-        os.system("alembic init migrations")
-
-    os.system('alembic revision --autogenerate -m "test runnnig migrations"')
-    os.system("alembic upgrade heads")
+    os.system(f"alembic -x db_url={settings.TEST_DATABASE_URL} upgrade head")
 
 
 @pytest_asyncio.fixture(scope="function")
@@ -40,18 +40,109 @@ async def asyncpg_pool():
         await pool.close()
 
 
-@pytest_asyncio.fixture(scope="function")
-async def async_session_test():
-    engine_test = create_async_engine(
-        settings.TEST_DATABASE_URL, future=True, echo=True
-    )
-    async_session_test = sessionmaker(
-        engine_test, expire_on_commit=False, class_=AsyncSession
+def build_settings(**overrides) -> SimpleNamespace:
+    """utils.settings с тестовой базой вместо основной и заменами из overrides."""
+    values = {name: getattr(settings, name) for name in dir(settings) if name.isupper()}
+    values.update(
+        REAL_DATABASE_URL=settings.TEST_DATABASE_URL,
+        REPLICA_DATABASE_URL="",
+        DB_ECHO=True,
     )
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+@pytest.fixture(scope="function")
+def make_settings():
+    """Фабрика настроек для приложений со своей базой: ``make_settings(**overrides)``."""
+    return build_settings
+
+
+@pytest.fixture(scope="function")
+def test_settings() -> SimpleNamespace:
+    return build_settings()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def database(test_settings):
+    database = Database(test_settings)
     try:
-        yield async_session_test
+        yield database
     finally:
-        await engine_test.dispose()
+        await database.dispose()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def make_database():
+    """Фабрика баз со своим пулом: ``make_database(DB_POOL_SIZE=1)``.
+
+    Все созданные базы закрываются после теста.
+    """
+    databases: List[Database] = []
+
+    def _make_database(**overrides) -> Database:
+        database = Database(build_settings(**overrides))
+        databases.append(database)
+        return database
+
+    try:
+        yield _make_database
+    finally:
+        for database in databases:
+            await database.dispose()
+
+
+@pytest.fixture(scope="function")
+def engine_test(database):
+    return database.engine
+
+
+@pytest.fixture(scope="function")
+def assert_query_count(engine_test):
+    """Проверяет точное число обращений к базе внутри блока::
+
+    with assert_query_count(1):
+        await client.get(...)
+
+    Считаются SQL запросы и BEGIN/COMMIT/ROLLBACK: каждый из них - отдельный
+    round-trip. Соединения в AUTOCOMMIT транзакций не открывают.
+    """
+
+    @contextmanager
+    def _assert_query_count(expected: int):
+        statements: List[str] = []
+
+        def _on_execute(conn, cursor, statement, parameters, context, many):
+            statements.append(statement)
+
+        def _on_transaction(statement: str):
+            def listener(conn, *args):
+                isolation_level = conn.get_execution_options().get("isolation_level")
+                if isolation_level != "AUTOCOMMIT":
+                    statements.append(statement)
+
+            return listener
+
+        listeners = [
+            ("before_cursor_execute", _on_execute),
+            ("begin", _on_transaction("BEGIN")),
+            ("commit", _on_transaction("COMMIT")),
+            ("rollback", _on_transaction("ROLLBACK")),
+        ]
+        for name, listener in listeners:
+            event.listen(engine_test.sync_engine, name, listener)
+        try:
+            yield statements
+        finally:
+            for name, listener in listeners:
+                event.remove(engine_test.sync_engine, name, listener)
+        assert (
+            len(statements) == expected
+        ), f"Expected {expected} queries, got {len(statements)}:\n" + "\n".join(
+            statements
+        )
+
+    return _assert_query_count
 
 
 @pytest_asyncio.fixture(scope="function", autouse=True)
@@ -62,15 +153,45 @@ async def clean_tables(asyncpg_pool):
             await conn.execute(f"TRUNCATE TABLE {table} RESTART IDENTITY CASCADE;")
 
 
-@pytest_asyncio.fixture(scope="function")
-async def client(async_session_test) -> AsyncGenerator[AsyncClient, None]:
-    async def _get_test_db():
-        yield async_session_test()
+@pytest.fixture(scope="function")
+def make_app(database):
+    """Фабрика приложений с заменой настроек: ``make_app(TOKEN_STATELESS=True)``.
 
-    app.dependency_overrides[get_db] = _get_test_db
+    lifespan не запускается, чтобы прогрев в фоне не мешал подсчету
+    запросов; база подключается так же, как в lifespan, и запросы идут
+    обычным путем: get_db, чтения в AUTOCOMMIT, loader'ы. Хешер, кеши и
+    фильтр занятых email у каждого приложения свои (app.state.services).
+    ``own_database`` - база из make_database вместо общей тестовой.
+    """
 
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+    def _make_app(own_database: Optional[Database] = None, **overrides):
+        app = create_app(build_settings(**overrides))
+        attach_database(app, own_database or database)
+        return app
+
+    return _make_app
+
+
+@pytest.fixture(scope="function")
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture(scope="function")
+def make_client():
+    """Фабрика клиентов приложения: ``async with make_client(app) as ac``."""
+
+    def _make_client(app, **kwargs) -> AsyncClient:
+        return AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test", **kwargs
+        )
+
+    return _make_client
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(app, make_client) -> AsyncGenerator[AsyncClient, None]:
+    async with make_client(app) as ac:
         yield ac
 
 
@@ -96,15 +217,20 @@ async def get_user_from_db(asyncpg_pool):
 @pytest_asyncio.fixture
 async def create_user_in_db(asyncpg_pool):
     async def create_user_in_db(
-        id: str, first_name: str, last_name: str, email: str, is_active: bool
+        id: str,
+        first_name: str,
+        last_name: str,
+        email: str,
+        is_active: bool,
+        hashed_password: str = "hashed_password",
     ):
         async with asyncpg_pool.acquire() as connection:
             return await connection.fetchrow(
                 """
                 INSERT INTO
-                    users(id, first_name, last_name, email, is_active)
+                    users(id, first_name, last_name, email, is_active, hashed_password)
                 VALUES
-                    ($1, $2, $3, $4, $5)
+                    ($1, $2, $3, $4, $5, $6)
                 RETURNING
                     *
                 """,
@@ -113,6 +239,7 @@ async def create_user_in_db(asyncpg_pool):
                 last_name,
                 email,
                 is_active,
+                hashed_password,
             )
 
     return create_user_in_db
@@ -0,0 +1,95 @@
+# tests/test_db/test_indexes.py
+"""Запросы репозиториев идут по нужным индексам.
+
+План строится для того SQL, который репозиторий действительно отправляет:
+вызов выполняется в транзакции, его запрос перехватывается и отдается в
+EXPLAIN, после чего транзакция откатывается.
+"""
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.repositories import UserReadRepository
+from db.repositories import UserRepository
+
+USER_ID = uuid4()
+EMAIL = "test@test.com"
+
+
+async def _explain_repository_call(engine, repository_class, call) -> str:
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    async with engine.connect() as connection:
+        # На почти пустой таблице планировщик всегда выбирает Seq Scan
+        await connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        session = AsyncSession(bind=connection)
+        event.listen(engine.sync_engine, "before_cursor_execute", capture)
+        try:
+            await call(repository_class(session))
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", capture)
+            await session.close()
+
+        statement, parameters = statements[-1]
+        result = await connection.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        plan = "\n".join(row[0] for row in result)
+        await connection.rollback()
+    return plan
+
+
+@pytest.mark.parametrize(
+    "repository_class, call, index",
+    [
+        (UserReadRepository, lambda repo: repo.get_by_id(USER_ID), "users_pkey"),
+        (UserReadRepository, lambda repo: repo.get_by_email(EMAIL), "users_email_key"),
+        (UserReadRepository, lambda repo: repo.email_exists(EMAIL), "users_email_key"),
+        (
+            UserReadRepository,
+            lambda repo: repo.existing_emails([EMAIL, "other@test.com"]),
+            "users_email_key",
+        ),
+        (
+            UserReadRepository,
+            lambda repo: repo.get_many_by_ids([USER_ID, uuid4()]),
+            "users_pkey",
+        ),
+        (
+            UserReadRepository,
+            lambda repo: repo.get_many_by_emails([EMAIL, "other@test.com"]),
+            "users_email_key",
+        ),
+        (
+            UserReadRepository,
+            lambda repo: repo.emails_page(after=None, limit=10),
+            "users_email_key",
+        ),
+        (UserReadRepository, lambda repo: repo.list_page(limit=10), "users_pkey"),
+        (
+            UserRepository,
+            lambda repo: repo.update(USER_ID, first_name="new"),
+            "users_pkey",
+        ),
+        (UserRepository, lambda repo: repo.delete(USER_ID), "users_pkey"),
+        (UserRepository, lambda repo: repo.delete_many([USER_ID]), "users_pkey"),
+    ],
+)
+async def test_repository_queries_use_index(
+    engine_test, create_user_in_db, repository_class, call, index
+):
+    await create_user_in_db(
+        id=USER_ID,
+        first_name="test",
+        last_name="test",
+        email=EMAIL,
+        is_active=True,
+    )
+
+    plan = await _explain_repository_call(engine_test, repository_class, call)
+
+    assert index in plan, plan
+    assert "Seq Scan" not in plan, plan
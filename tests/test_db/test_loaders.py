@@ -0,0 +1,60 @@
+# tests/test_db/test_loaders.py
+import asyncio
+
+from db.loaders import BatchLoader
+from utils import timing
+
+
+def make_loader():
+    calls = []
+    release = asyncio.Event()
+    release.set()
+
+    async def batch_fn(keys):
+        calls.append(keys)
+        timing.record("db", 0.01)
+        await release.wait()
+        return {key: f"value-{key}" for key in keys}
+
+    return BatchLoader(batch_fn), calls, release
+
+
+async def test_loads_in_one_tick_make_one_call():
+    loader, calls, _ = make_loader()
+
+    results = await asyncio.gather(loader.load(1), loader.load(2), loader.load(3))
+
+    assert results == ["value-1", "value-2", "value-3"]
+    assert calls == [[1, 2, 3]]
+
+
+async def test_duplicate_keys_are_loaded_once():
+    loader, calls, release = make_loader()
+    release.clear()
+
+    first = asyncio.ensure_future(loader.load(1))
+    while not calls:
+        await asyncio.sleep(0)
+    # Ключ уже запрошен: новые ожидающие присоединяются к тому же вызову
+    duplicates = asyncio.ensure_future(asyncio.gather(loader.load(1), loader.load(1)))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await first == "value-1"
+    assert await duplicates == ["value-1", "value-1"]
+    assert calls == [[1]]
+
+
+async def test_batch_timings_are_recorded_for_every_waiter():
+    loader, calls, _ = make_loader()
+
+    async def request(key):
+        with timing.collect() as timings:
+            await loader.load(key)
+        return timings
+
+    first, second, same_key = await asyncio.gather(request(1), request(2), request(1))
+
+    assert calls == [[1, 2]]
+    for timings in (first, second, same_key):
+        assert timings.counts == {"db": 1}
@@ -0,0 +1,30 @@
+# tests/test_db/test_warmup.py
+import pytest
+import pytest_asyncio
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import utils.settings as settings
+from db.warmup import warm_up_engine
+
+
+@pytest_asyncio.fixture
+async def standby_engine():
+    # Как реплика в режиме hot standby: любая запись отклоняется
+    engine = create_async_engine(
+        settings.TEST_DATABASE_URL,
+        connect_args={"server_settings": {"default_transaction_read_only": "on"}},
+    )
+    try:
+        yield engine
+    finally:
+        await engine.dispose()
+
+
+async def test_read_only_warm_up_runs_on_standby(standby_engine):
+    await warm_up_engine(standby_engine, connections=2, read_only=True)
+
+
+async def test_full_warm_up_is_rejected_by_standby(standby_engine):
+    with pytest.raises(DBAPIError):
+        await warm_up_engine(standby_engine, connections=1)
@@ -0,0 +1,139 @@
+# tests/test_handlers/test_batch_create_handlers.py
+from uuid import uuid4
+
+
+async def test_create_users_batch(client, get_user_from_db):
+    users_data = [
+        {
+            "first_name": "first",
+            "last_name": "user",
+            "email": "first@test.com",
+            "password": "password1",
+        },
+        {
+            "first_name": "second",
+            "last_name": "user",
+            "email": "second@test.com",
+            "password": "password2",
+        },
+    ]
+
+    resp = await client.post("/user/batch", json={"users": users_data})
+    data = resp.json()
+
+    assert resp.status_code == 200
+    assert data["errors"] == []
+    assert [user["email"] for user in data["created"]] == [
+        user["email"] for user in users_data
+    ]
+
+    for created_user in data["created"]:
+        user_from_db = await get_user_from_db(created_user["id"])
+
+        assert str(user_from_db["id"]) == created_user["id"]
+        assert user_from_db["email"] == created_user["email"]
+        assert user_from_db["is_active"] is True
+
+
+async def test_create_users_batch_reports_item_errors(client):
+    existing_user = {
+        "first_name": "existing",
+        "last_name": "user",
+        "email": "existing@test.com",
+        "password": "password1",
+    }
+    resp = await client.post("/user/batch", json={"users": [existing_user]})
+
+    assert resp.status_code == 200
+
+    users_data = [
+        {
+            "first_name": "valid",
+            "last_name": "user",
+            "email": "valid@test.com",
+            "password": "password1",
+        },
+        existing_user,
+        {
+            "first_name": "short",
+            "last_name": "password",
+            "email": "short@test.com",
+            "password": "short",
+        },
+        {
+            "first_name": "invalid",
+            "last_name": "email",
+            "email": "invalid",
+            "password": "password1",
+        },
+        {
+            "first_name": "again",
+            "last_name": "valid",
+            "email": "valid@test.com",
+            "password": "password1",
+        },
+    ]
+
+    resp = await client.post("/user/batch", json={"users": users_data})
+    data = resp.json()
+
+    assert resp.status_code == 200
+    assert [user["email"] for user in data["created"]] == ["valid@test.com"]
+    assert [error["index"] for error in data["errors"]] == [1, 2, 3, 4]
+    assert data["errors"][0]["detail"] == (
+        "User with email existing@test.com already exists"
+    )
+    assert data["errors"][1]["detail"] == "Password must have at least 8 letters"
+    assert data["errors"][2]["email"] == "invalid"
+    assert data["errors"][3]["detail"] == "Duplicate email in batch"
+
+
+async def test_create_users_batch_empty(client):
+    resp = await client.post("/user/batch", json={"users": []})
+
+    assert resp.status_code == 422
+    assert resp.json() == {"detail": "At least one user should be provided"}
+
+
+async def test_create_users_batch_hashes_only_new_users(
+    app, client, create_user_in_db, assert_query_count
+):
+    await create_user_in_db(
+        id=uuid4(),
+        first_name="existing",
+        last_name="user",
+        email="existing@test.com",
+        is_active=False,
+    )
+    # Строка вставлена мимо репозитория, как будто ее создал другой воркер
+    services = app.state.services
+    services.taken_emails.add("existing@test.com")
+    hashed_before = services.hasher.submitted
+
+    user = {"first_name": "test", "last_name": "user", "password": "password1"}
+    users_data = [
+        {**user, "email": "new@test.com"},
+        {**user, "email": "existing@test.com"},
+        {**user, "email": "new@test.com"},
+    ]
+    # SELECT занятых email в AUTOCOMMIT, затем BEGIN, INSERT и COMMIT
+    with assert_query_count(4):
+        resp = await client.post("/user/batch", json={"users": users_data})
+    data = resp.json()
+
+    assert resp.status_code == 200
+    assert [user["email"] for user in data["created"]] == ["new@test.com"]
+    assert [error["index"] for error in data["errors"]] == [1, 2]
+    assert services.hasher.submitted == hashed_before + 1
+
+
+async def test_create_users_batch_size_limit(make_app, make_client):
+    app = make_app(USER_BATCH_CREATE_MAX_SIZE=2)
+    user = {"first_name": "test", "last_name": "user", "password": "password1"}
+    users_data = [{**user, "email": f"user{number}@test.com"} for number in range(3)]
+
+    async with make_client(app) as ac:
+        resp = await ac.post("/user/batch", json={"users": users_data})
+
+    assert resp.status_code == 422
+    assert resp.json() == {"detail": "Batch size must not exceed 2"}
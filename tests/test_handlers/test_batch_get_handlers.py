@@ -0,0 +1,53 @@
+# tests/test_handlers/test_batch_get_handlers.py
+from uuid import uuid4
+
+
+async def test_get_users_batch(client, create_user_in_db):
+    users_data = [
+        {
+            "id": uuid4(),
+            "first_name": "test",
+            "last_name": "test",
+            "email": f"test{number}@test.com",
+            "is_active": True,
+        }
+        for number in range(3)
+    ]
+    for user_data in users_data:
+        await create_user_in_db(**user_data)
+
+    missing_id = uuid4()
+    ids = ",".join(str(user_id) for user_id in [users_data[0]["id"], missing_id])
+    resp = await client.get(
+        f"/user/batch?ids={ids}&ids={users_data[1]['id']}&ids={users_data[0]['id']}"
+    )
+    data = resp.json()
+
+    assert resp.status_code == 200
+    assert sorted(user["id"] for user in data["items"]) == sorted(
+        [str(users_data[0]["id"]), str(users_data[1]["id"])]
+    )
+    assert data["not_found"] == [str(missing_id)]
+
+
+async def test_get_users_batch_skips_inactive(client, create_user_in_db):
+    user_data = {
+        "id": uuid4(),
+        "first_name": "test",
+        "last_name": "test",
+        "email": "test@test.com",
+        "is_active": False,
+    }
+    await create_user_in_db(**user_data)
+
+    resp = await client.get(f"/user/batch?ids={user_data['id']}")
+
+    assert resp.status_code == 200
+    assert resp.json() == {"items": [], "not_found": [str(user_data["id"])]}
+
+
+async def test_get_users_batch_invalid_id(client):
+    resp = await client.get("/user/batch?ids=123")
+
+    assert resp.status_code == 422
+    assert resp.json() == {"detail": "Invalid user id"}
@@ -0,0 +1,88 @@
+# tests/test_handlers/test_batch_write_handlers.py
+from uuid import uuid4
+
+
+async def _create_users(create_user_in_db, count: int):
+    users = []
+    for number in range(count):
+        user_data = {
+            "id": uuid4(),
+            "first_name": "test",
+            "last_name": "test",
+            "email": f"test{number}@test.com",
+            "is_active": True,
+        }
+        await create_user_in_db(**user_data)
+        users.append(user_data)
+    return users
+
+
+async def test_delete_users_batch(client, create_user_in_db, get_user_from_db):
+    users = await _create_users(create_user_in_db, 3)
+    missing_id = uuid4()
+    ids = [str(users[0]["id"]), str(missing_id), str(users[1]["id"])]
+
+    resp = await client.request("DELETE", "/user/batch", json={"ids": ids})
+
+    assert resp.status_code == 200
+    assert resp.json() == {
+        "affected": [str(users[0]["id"]), str(users[1]["id"])],
+        "not_found": [str(missing_id)],
+    }
+
+    assert (await get_user_from_db(users[0]["id"]))["is_active"] is False
+    assert (await get_user_from_db(users[1]["id"]))["is_active"] is False
+    assert (await get_user_from_db(users[2]["id"]))["is_active"] is True
+
+
+async def test_delete_users_batch_already_deleted(client, create_user_in_db):
+    users = await _create_users(create_user_in_db, 1)
+    ids = [str(users[0]["id"])]
+
+    resp = await client.request("DELETE", "/user/batch", json={"ids": ids})
+    assert resp.status_code == 200
+
+    resp = await client.request("DELETE", "/user/batch", json={"ids": ids})
+
+    assert resp.status_code == 200
+    assert resp.json() == {"affected": [], "not_found": ids}
+
+
+async def test_update_users_batch(client, create_user_in_db, get_user_from_db):
+    users = await _create_users(create_user_in_db, 2)
+    missing_id = uuid4()
+    items = [
+        {"id": str(users[0]["id"]), "first_name": "updated"},
+        {"id": str(users[1]["id"]), "email": "updated@test.com"},
+        {"id": str(missing_id), "last_name": "missing"},
+    ]
+
+    resp = await client.patch("/user/batch", json={"items": items})
+
+    assert resp.status_code == 200
+    assert resp.json() == {
+        "affected": [str(users[0]["id"]), str(users[1]["id"])],
+        "not_found": [str(missing_id)],
+    }
+
+    first_user = await get_user_from_db(users[0]["id"])
+    assert first_user["first_name"] == "updated"
+    assert first_user["last_name"] == users[0]["last_name"]
+    assert first_user["email"] == users[0]["email"]
+
+    second_user = await get_user_from_db(users[1]["id"])
+    assert second_user["first_name"] == users[1]["first_name"]
+    assert second_user["email"] == "updated@test.com"
+
+
+async def test_update_users_batch_duplicate_ids(client):
+    user_id = str(uuid4())
+    items = [
+        {"id": user_id, "first_name": "first"},
+        {"id": user_id, "last_name": "second"},
+    ]
+
+    resp = await client.patch("/user/batch", json={"items": items})
+
+    assert resp.status_code == 422
+    assert resp.json() == {"detail": "User ids must be unique"}
@@ -1,4 +1,13 @@
 # tests/test_handlers/test_create_handlers.py
+import asyncio
+import threading
+from uuid import uuid4
+
+import pytest
+
+from utils.hasher import AsyncHasher
+from utils.hasher import Hasher
+from utils.hasher import HasherOverloadedError
 
 
 async def test_create_user(client, get_user_from_db):
@@ -22,7 +31,12 @@ async def test_create_user(client, get_user_from_db):
 
 
 async def test_create_user_dublicate_email_error(client):
-    user_data = {"first_name": "test", "last_name": "test", "email": "test@test.com"}
+    user_data = {
+        "first_name": "test",
+        "last_name": "test",
+        "email": "test@test.com",
+        "password": "password",
+    }
 
     resp = await client.post("/user/", json=user_data)
 
@@ -32,15 +46,13 @@ async def test_create_user_dublicate_email_error(client):
         "first_name": "contest",
         "last_name": "contest",
         "email": "test@test.com",
+        "password": "password",
     }
 
     resp = await client.post("/user/", json=user_data_with_dublicate_email)
 
-    assert resp.status_code == 503
-    assert (
-        'duplicate key value violates unique constraint "users_email_key"'
-        in resp.json()["detail"]
-    )
+    assert resp.status_code == 409
+    assert resp.json() == {"detail": "User with this email already exists"}
 
 
 async def test_create_user_missing_fields(client):
@@ -95,3 +107,93 @@ async def test_create_user_invalid_email(client):
         == "value is not a valid email address: An email address must have an @-sign."
     )
     assert data["detail"][0]["type"] == "value_error"
+
+
+async def test_create_user_duplicate_email_skips_hashing(
+    app, client, create_user_in_db, assert_query_count
+):
+    await create_user_in_db(
+        id=uuid4(),
+        first_name="test",
+        last_name="test",
+        email="test@test.com",
+        is_active=False,
+    )
+    # Строка вставлена мимо репозитория, как будто ее создал другой воркер
+    services = app.state.services
+    services.taken_emails.add("test@test.com")
+    hashed_before = services.hasher.submitted
+
+    user_data = {
+        "first_name": "test",
+        "last_name": "test",
+        "email": "test@test.com",
+        "password": "password",
+    }
+    # Один SELECT в AUTOCOMMIT: проверка email, без хеширования и INSERT
+    with assert_query_count(1):
+        resp = await client.post("/user/", json=user_data)
+
+    assert resp.status_code == 409
+    assert services.hasher.submitted == hashed_before
+
+
+async def test_create_user_duplicate_email_missed_by_filter(client, create_user_in_db):
+    await create_user_in_db(
+        id=uuid4(),
+        first_name="test",
+        last_name="test",
+        email="test@test.com",
+        is_active=True,
+    )
+    user_data = {
+        "first_name": "test",
+        "last_name": "test",
+        "email": "test@test.com",
+        "password": "password",
+    }
+
+    resp = await client.post("/user/", json=user_data)
+
+    assert resp.status_code == 409
+    assert resp.json() == {"detail": "User with this email already exists"}
+
+
+async def test_create_user_rejected_when_hasher_is_full(app, client, monkeypatch):
+    release = threading.Event()
+    get_password_hash = Hasher.get_password_hash
+
+    def blocking_hash(password, options=()):
+        release.wait(timeout=10)
+        return get_password_hash(password, options)
+
+    monkeypatch.setattr(Hasher, "get_password_hash", staticmethod(blocking_hash))
+    hasher = AsyncHasher(max_workers=1, max_queue=1)
+    app.state.services.hasher = hasher
+    user_data = {
+        "first_name": "test",
+        "last_name": "test",
+        "email": "test@test.com",
+        "password": "password",
+    }
+
+    first = asyncio.create_task(client.post("/user/", json=user_data))
+    try:
+        while hasher.in_flight < 1:
+            await asyncio.sleep(0.01)
+
+        with pytest.raises(HasherOverloadedError):
+            await hasher.get_password_hash("password")
+        resp = await client.post(
+            "/user/", json={**user_data, "email": "other@test.com"}
+        )
+    finally:
+        release.set()
+        first_resp = await first
+        hasher.shutdown()
+
+    assert resp.status_code == 503
+    assert resp.json() == {"detail": "Server is busy, try again later"}
+    assert resp.headers["Retry-After"] == "1"
+    assert first_resp.status_code == 200
+    assert hasher.rejected == 2
@@ -0,0 +1,95 @@
+# tests/test_handlers/test_database_busy.py
+"""Запросы сверх лимита AdmissionController сразу получают 503."""
+import asyncio
+import threading
+from uuid import uuid4
+
+import pytest
+import pytest_asyncio
+
+from utils.hasher import Hasher
+
+
+@pytest.fixture
+def busy_app(make_app, make_database):
+    # Лимит в один запрос: одно соединение без overflow и без очереди
+    overrides = {
+        "DB_POOL_SIZE": 1,
+        "DB_MAX_OVERFLOW": 0,
+        "DB_MAX_WAITING": 0,
+        "DB_RETRY_AFTER_SECONDS": 3,
+    }
+    return make_app(own_database=make_database(**overrides), **overrides)
+
+
+@pytest_asyncio.fixture
+async def busy_client(busy_app, make_client):
+    async with make_client(busy_app) as ac:
+        yield ac
+
+
+async def test_request_over_limit_gets_503(busy_app, busy_client):
+    admission = busy_app.state.db.admission
+    assert admission.limit == 1
+
+    # Единственный слот занят другим запросом
+    assert admission.try_acquire()
+    try:
+        resp = await busy_client.get("/user/list")
+    finally:
+        admission.release()
+
+    assert resp.status_code == 503
+    assert resp.json() == {"detail": "Database is busy, try again later"}
+    assert resp.headers["Retry-After"] == "3"
+    assert admission.rejected == 1
+
+
+async def test_slot_is_released_after_request(busy_app, busy_client):
+    admission = busy_app.state.db.admission
+
+    resp = await busy_client.get("/user/list")
+    assert resp.status_code == 200
+    assert admission.in_flight == 0
+
+    # И после ответа с ошибкой
+    resp = await busy_client.get(f"/user/?user_id={uuid4()}")
+    assert resp.status_code == 404
+    assert admission.in_flight == 0
+
+    resp = await busy_client.get("/user/list")
+    assert resp.status_code == 200
+    assert admission.admitted == 3
+    assert admission.rejected == 0
+
+
+async def test_hashing_does_not_hold_a_slot(busy_app, busy_client, monkeypatch):
+    release = threading.Event()
+    get_password_hash = Hasher.get_password_hash
+
+    def blocking_hash(password, options=()):
+        release.wait(timeout=10)
+        return get_password_hash(password, options)
+
+    monkeypatch.setattr(Hasher, "get_password_hash", staticmethod(blocking_hash))
+    hasher = busy_app.state.services.hasher
+    user_data = {
+        "first_name": "test",
+        "last_name": "test",
+        "email": "test@test.com",
+        "password": "password",
+    }
+
+    create = asyncio.create_task(busy_client.post("/user/", json=user_data))
+    try:
+        while hasher.in_flight < 1:
+            await asyncio.sleep(0.01)
+        # Создание ждет хеш без соединения, единственный слот свободен
+        resp = await busy_client.get("/user/list")
+    finally:
+        release.set()
+        create_resp = await create
+
+    assert resp.status_code == 200
+    assert create_resp.status_code == 200
+    assert busy_app.state.db.admission.rejected == 0
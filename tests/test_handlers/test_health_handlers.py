@@ -0,0 +1,76 @@
+# tests/test_handlers/test_health_handlers.py
+import asyncio
+
+import main
+
+
+async def test_live(client):
+    resp = await client.get("/health/live")
+    assert resp.status_code == 200
+    assert resp.json() == {"status": "ok"}
+
+
+async def test_ready_only_after_warm_up(app, client):
+    app.state.ready = False
+    resp = await client.get("/health/ready")
+    assert resp.status_code == 503
+
+    app.state.ready = True
+    resp = await client.get("/health/ready")
+    assert resp.status_code == 200
+    assert resp.json() == {"status": "ready"}
+
+
+async def test_warm_up_retries_primary_pool(app, make_settings, monkeypatch):
+    attempts = []
+    warm_up_engine = main.warm_up_engine
+
+    async def flaky_warm_up_engine(engine, connections, read_only=False):
+        attempts.append(engine)
+        if len(attempts) == 1:
+            raise ConnectionRefusedError("database is starting up")
+        await warm_up_engine(engine, connections, read_only=read_only)
+
+    monkeypatch.setattr(main, "warm_up_engine", flaky_warm_up_engine)
+    app.state.ready = False
+
+    await main.warm_up(app, make_settings(DB_POOL_WARMUP_RETRY_SECONDS=0))
+
+    assert len(attempts) == 2
+    assert app.state.ready is True
+
+
+async def test_not_ready_while_primary_pool_fails(
+    app, client, make_settings, monkeypatch
+):
+    async def failing_warm_up_engine(engine, connections, read_only=False):
+        raise ConnectionRefusedError("database is down")
+
+    monkeypatch.setattr(main, "warm_up_engine", failing_warm_up_engine)
+    app.state.ready = False
+
+    task = asyncio.create_task(
+        main.warm_up(app, make_settings(DB_POOL_WARMUP_RETRY_SECONDS=0.01))
+    )
+    try:
+        await asyncio.sleep(0.2)
+        resp = await client.get("/health/ready")
+        assert not task.done()
+    finally:
+        task.cancel()
+
+    assert resp.status_code == 503
+
+
+async def test_warm_up_is_ready_when_optional_step_fails(
+    app, make_settings, monkeypatch
+):
+    async def failing_hasher_warm_up():
+        raise RuntimeError("hasher pool failed to start")
+
+    monkeypatch.setattr(app.state.services.hasher, "warm_up", failing_hasher_warm_up)
+    app.state.ready = False
+
+    await main.warm_up(app, make_settings())
+
+    assert app.state.ready is True
@@ -0,0 +1,181 @@
+# tests/test_handlers/test_idempotency.py
+import asyncio
+import hashlib
+import threading
+from uuid import uuid4
+
+from utils.hasher import Hasher
+
+USER_DATA = {
+    "first_name": "test",
+    "last_name": "test",
+    "email": "test@test.com",
+    "password": "password",
+}
+
+
+async def test_create_user_replays_response(client, assert_query_count):
+    headers = {"Idempotency-Key": str(uuid4())}
+    resp = await client.post("/user/", json=USER_DATA, headers=headers)
+    assert resp.status_code == 200
+
+    with assert_query_count(0):
+        replay = await client.post("/user/", json=USER_DATA, headers=headers)
+
+    assert replay.status_code == 200
+    assert replay.json() == resp.json()
+    assert replay.headers["Idempotent-Replayed"] == "true"
+
+
+async def test_concurrent_requests_with_same_key_wait_for_first(client):
+    headers = {"Idempotency-Key": str(uuid4())}
+    responses = await asyncio.gather(
+        *(client.post("/user/", json=USER_DATA, headers=headers) for _ in range(3))
+    )
+
+    assert [resp.status_code for resp in responses] == [200, 200, 200]
+    assert len({resp.json()["id"] for resp in responses}) == 1
+
+
+async def test_same_key_with_different_body_is_rejected(client):
+    headers = {"Idempotency-Key": str(uuid4())}
+    resp = await client.post("/user/", json=USER_DATA, headers=headers)
+    assert resp.status_code == 200
+
+    resp = await client.post(
+        "/user/", json={**USER_DATA, "email": "other@test.com"}, headers=headers
+    )
+
+    assert resp.status_code == 422
+    assert resp.json() == {
+        "detail": "Idempotency-Key was already used with a different request"
+    }
+
+
+async def test_login_replays_token(client, assert_query_count):
+    resp = await client.post("/user/", json=USER_DATA)
+    assert resp.status_code == 200
+
+    form_data = {"username": USER_DATA["email"], "password": USER_DATA["password"]}
+    headers = {"Idempotency-Key": str(uuid4())}
+    resp = await client.post("/login/token", data=form_data, headers=headers)
+    assert resp.status_code == 200
+
+    with assert_query_count(0):
+        replay = await client.post("/login/token", data=form_data, headers=headers)
+
+    assert replay.json() == resp.json()
+
+
+async def test_keys_are_scoped_by_authorization(client):
+    key = str(uuid4())
+    resp = await client.post(
+        "/user/",
+        json=USER_DATA,
+        headers={"Idempotency-Key": key, "Authorization": "Bearer first"},
+    )
+    assert resp.status_code == 200
+
+    resp = await client.post(
+        "/user/",
+        json=USER_DATA,
+        headers={"Idempotency-Key": key, "Authorization": "Bearer second"},
+    )
+
+    # Запрос выполнился заново и наткнулся на занятый email
+    assert "Idempotent-Replayed" not in resp.headers
+    assert resp.status_code != 200
+
+
+async def test_body_over_limit_is_rejected(make_app, assert_query_count, make_client):
+    app = make_app(IDEMPOTENCY_MAX_BODY_BYTES=16)
+    async with make_client(app) as ac:
+        with assert_query_count(0):
+            resp = await ac.post(
+                "/user/", json=USER_DATA, headers={"Idempotency-Key": str(uuid4())}
+            )
+
+    assert resp.status_code == 413
+
+
+async def test_database_backend_replays_across_apps(
+    make_app, assert_query_count, make_client
+):
+    # Два приложения с общей базой ведут себя как два воркера
+    first, second = (make_app(IDEMPOTENCY_BACKEND="database") for _ in range(2))
+    headers = {"Idempotency-Key": str(uuid4())}
+
+    async with make_client(first) as ac:
+        resp = await ac.post("/user/", json=USER_DATA, headers=headers)
+    assert resp.status_code == 200
+
+    async with make_client(second) as ac:
+        with assert_query_count(1):
+            replay = await ac.post("/user/", json=USER_DATA, headers=headers)
+
+    assert replay.status_code == 200
+    assert replay.json() == resp.json()
+    assert replay.headers["Idempotent-Replayed"] == "true"
+
+
+async def test_database_backend_waits_for_request_in_other_app(
+    make_app, monkeypatch, make_client
+):
+    release = threading.Event()
+    get_password_hash = Hasher.get_password_hash
+
+    def blocking_hash(password, options=()):
+        release.wait(timeout=10)
+        return get_password_hash(password, options)
+
+    monkeypatch.setattr(Hasher, "get_password_hash", staticmethod(blocking_hash))
+    first, second = (make_app(IDEMPOTENCY_BACKEND="database") for _ in range(2))
+    headers = {"Idempotency-Key": str(uuid4())}
+
+    async with make_client(first) as first_client, make_client(second) as second_client:
+        create = asyncio.create_task(
+            first_client.post("/user/", json=USER_DATA, headers=headers)
+        )
+        try:
+            # Ключ захвачен до вызова обработчика, хеш еще считается
+            while first.state.services.hasher.in_flight < 1:
+                await asyncio.sleep(0.01)
+            retry = asyncio.create_task(
+                second_client.post("/user/", json=USER_DATA, headers=headers)
+            )
+            await asyncio.sleep(0.2)
+            assert not retry.done()
+        finally:
+            release.set()
+            resp = await create
+        replay = await retry
+
+    assert resp.status_code == 200
+    assert replay.status_code == 200
+    assert replay.json() == resp.json()
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert second.state.services.hasher.submitted == 0
+
+
+async def test_database_backend_does_not_store_login_tokens(
+    make_app, asyncpg_pool, make_client
+):
+    app = make_app(IDEMPOTENCY_BACKEND="database")
+    form_data = {"username": USER_DATA["email"], "password": USER_DATA["password"]}
+    headers = {"Idempotency-Key": str(uuid4())}
+
+    async with make_client(app) as ac:
+        resp = await ac.post("/user/", json=USER_DATA, headers=headers)
+        assert resp.status_code == 200
+        login = await ac.post("/login/token", data=form_data, headers=headers)
+        replay = await ac.post("/login/token", data=form_data, headers=headers)
+
+    assert login.status_code == 200
+    # Повтор логина в том же процессе все равно отдается из памяти
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    async with asyncpg_pool.acquire() as connection:
+        rows = await connection.fetch("SELECT key, fingerprint FROM idempotency_keys")
+    assert [row["key"].split()[:2] for row in rows] == [["POST", "/user/"]]
+    # Отпечаток - HMAC: по нему нельзя проверить догадку о теле запроса
+    body = resp.request.content
+    assert rows[0]["fingerprint"] != hashlib.sha256(body).hexdigest()
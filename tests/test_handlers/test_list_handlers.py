@@ -0,0 +1,78 @@
+# tests/test_handlers/test_list_handlers.py
+from uuid import uuid4
+
+
+async def _create_users(create_user_in_db, count: int, is_active: bool = True):
+    users = []
+    for number in range(count):
+        user_data = {
+            "id": uuid4(),
+            "first_name": "test",
+            "last_name": "test",
+            "email": f"user{number}-{is_active}@test.com",
+            "is_active": is_active,
+        }
+        await create_user_in_db(**user_data)
+        users.append(user_data)
+    return users
+
+
+async def test_list_users_pages_by_id(client, create_user_in_db):
+    users = await _create_users(create_user_in_db, 5)
+    expected_ids = sorted(str(user["id"]) for user in users)
+
+    resp = await client.get("/user/list?limit=2")
+    data = resp.json()
+
+    assert resp.status_code == 200
+    assert [user["id"] for user in data["items"]] == expected_ids[:2]
+    assert data["next_cursor"] is not None
+
+    received_ids = [user["id"] for user in data["items"]]
+    while data["next_cursor"]:
+        resp = await client.get(f"/user/list?limit=2&cursor={data['next_cursor']}")
+        data = resp.json()
+        assert resp.status_code == 200
+        received_ids.extend(user["id"] for user in data["items"])
+
+    assert received_ids == expected_ids
+
+
+async def test_list_users_by_email_and_is_active(client, create_user_in_db):
+    active_users = await _create_users(create_user_in_db, 3)
+    await _create_users(create_user_in_db, 2, is_active=False)
+
+    resp = await client.get("/user/list?order_by=email&is_active=true")
+    data = resp.json()
+
+    assert resp.status_code == 200
+    assert [user["email"] for user in data["items"]] == sorted(
+        user["email"] for user in active_users
+    )
+    assert all(user["is_active"] for user in data["items"])
+    assert data["next_cursor"] is None
+
+
+async def test_list_users_invalid_cursor(client):
+    resp = await client.get("/user/list?cursor=invalid")
+
+    assert resp.status_code == 422
+    assert resp.json() == {"detail": "Invalid cursor"}
+
+
+async def test_list_users_cursor_from_other_order(client, create_user_in_db):
+    await _create_users(create_user_in_db, 2)
+
+    resp = await client.get("/user/list?limit=1")
+    cursor = resp.json()["next_cursor"]
+
+    resp = await client.get(f"/user/list?order_by=email&cursor={cursor}")
+
+    assert resp.status_code == 422
+    assert resp.json() == {"detail": "Invalid cursor"}
+
+
+async def test_list_users_limit_above_max(client):
+    resp = await client.get("/user/list?limit=100000")
+
+    assert resp.status_code == 422
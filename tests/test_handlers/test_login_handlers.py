@@ -0,0 +1,336 @@
+# tests/test_handlers/test_login_handlers.py
+import time
+from uuid import uuid4
+
+import pytest
+import pytest_asyncio
+
+from db.loaders import UserLoader
+from db.repositories import UserRepository
+from utils.hasher import AsyncHasher
+from utils.hasher import Hasher
+from utils.ratelimit import InMemorySlidingWindowBackend
+from utils.ratelimit import LoginRateLimiter
+from utils.security import create_access_token
+
+
+@pytest.fixture
+def login_rate_limiter(app):
+    limiter = LoginRateLimiter(
+        backend=InMemorySlidingWindowBackend(), per_email=2, per_ip=100, window=60
+    )
+    app.state.services.login_rate_limiter = limiter
+    return limiter
+
+
+async def test_login_rejects_attempts_over_limit(client, login_rate_limiter):
+    form_data = {"username": "test@test.com", "password": "wrong_password"}
+
+    for _ in range(2):
+        resp = await client.post("/login/token", data=form_data)
+        assert resp.status_code == 401
+
+    resp = await client.post("/login/token", data=form_data)
+
+    assert resp.status_code == 429
+    assert resp.json() == {"detail": "Too many login attempts, try again later"}
+    assert int(resp.headers["Retry-After"]) > 0
+    assert login_rate_limiter.rejected_by_email == 1
+
+    resp = await client.get("/metrics")
+    assert 'login_rate_limited_total{dimension="email"}' in resp.text
+
+
+async def test_login_limit_is_per_email(client, login_rate_limiter):
+    for _ in range(2):
+        resp = await client.post(
+            "/login/token",
+            data={"username": "first@test.com", "password": "wrong_password"},
+        )
+        assert resp.status_code == 401
+
+    resp = await client.post(
+        "/login/token",
+        data={"username": "second@test.com", "password": "wrong_password"},
+    )
+
+    assert resp.status_code == 401
+
+
+async def test_login_limit_can_be_disabled(make_app, make_client):
+    app = make_app(LOGIN_RATE_LIMIT_ENABLED=False, LOGIN_RATE_LIMIT_PER_EMAIL=1)
+    assert app.state.services.login_rate_limiter is None
+    form_data = {"username": "test@test.com", "password": "wrong_password"}
+
+    async with make_client(app) as ac:
+        for _ in range(3):
+            resp = await ac.post("/login/token", data=form_data)
+            assert resp.status_code == 401
+
+
+async def test_login_returns_503_when_hasher_is_overloaded(app, client):
+    user_data = {
+        "first_name": "test",
+        "last_name": "test",
+        "email": "test@test.com",
+        "password": "password",
+    }
+    resp = await client.post("/user/", json=user_data)
+    assert resp.status_code == 200
+    # Очередь без мест: любая задача хеширования отклоняется
+    app.state.services.hasher = AsyncHasher(max_workers=1, max_queue=0)
+
+    resp = await client.post(
+        "/login/token", data={"username": "test@test.com", "password": "password"}
+    )
+
+    assert resp.status_code == 503
+    assert resp.json() == {"detail": "Server is busy, try again later"}
+    assert resp.headers["Retry-After"] == "1"
+
+
+async def _create_user_and_login(client, email: str = "test@test.com") -> tuple:
+    user_data = {
+        "first_name": "test",
+        "last_name": "test",
+        "email": email,
+        "password": "password",
+    }
+    resp = await client.post("/user/", json=user_data)
+    assert resp.status_code == 200
+    user_id = resp.json()["id"]
+
+    resp = await client.post(
+        "/login/token", data={"username": email, "password": "password"}
+    )
+    assert resp.status_code == 200
+    return user_id, {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+async def test_deleted_user_token_is_rejected_immediately(client, monkeypatch):
+    user_id, headers = await _create_user_and_login(client)
+    resp = await client.get("/login/test_auth_endpoint", headers=headers)
+    assert resp.status_code == 200
+
+    delete = UserRepository.delete
+
+    async def delete_then_authenticate(self, user_id):
+        user = await delete(self, user_id)
+        # Строка уже удалена, но кеш еще не сброшен: запрос видит старую
+        resp = await client.get("/login/test_auth_endpoint", headers=headers)
+        assert resp.status_code == 200
+        return user
+
+    monkeypatch.setattr(UserRepository, "delete", delete_then_authenticate)
+    resp = await client.delete(f"/user/?user_id={user_id}")
+    assert resp.status_code == 200
+
+    resp = await client.get("/login/test_auth_endpoint", headers=headers)
+    assert resp.status_code == 401
+
+
+async def test_user_deleted_during_load_is_not_cached(client, monkeypatch):
+    user_id, headers = await _create_user_and_login(client)
+    load_by_email = UserLoader.load_by_email
+
+    async def load_then_delete(self, email):
+        user = await load_by_email(self, email)
+        monkeypatch.setattr(UserLoader, "load_by_email", load_by_email)
+        # Строка прочитана до удаления, кеш сброшен, пока она еще в пути
+        resp = await client.delete(f"/user/?user_id={user_id}")
+        assert resp.status_code == 200
+        return user
+
+    monkeypatch.setattr(UserLoader, "load_by_email", load_then_delete)
+    resp = await client.get("/login/test_auth_endpoint", headers=headers)
+    assert resp.status_code == 200
+
+    resp = await client.get("/login/test_auth_endpoint", headers=headers)
+    assert resp.status_code == 401
+
+
+async def test_principal_cache_can_be_disabled(make_app, make_client):
+    app = make_app(PRINCIPAL_CACHE_SIZE=0)
+    assert app.state.services.principal_cache is None
+
+    async with make_client(app) as ac:
+        user_id, headers = await _create_user_and_login(ac)
+        resp = await ac.get("/login/test_auth_endpoint", headers=headers)
+        assert resp.status_code == 200
+        resp = await ac.delete(f"/user/?user_id={user_id}")
+        assert resp.status_code == 200
+        resp = await ac.get("/login/test_auth_endpoint", headers=headers)
+
+    assert resp.status_code == 401
+
+
+@pytest_asyncio.fixture
+async def stateless_client(make_app, make_client):
+    async with make_client(make_app(TOKEN_STATELESS=True)) as ac:
+        yield ac
+
+
+async def test_stateless_token_is_verified_without_database(
+    stateless_client, assert_query_count
+):
+    user_id, headers = await _create_user_and_login(stateless_client)
+
+    with assert_query_count(0):
+        resp = await stateless_client.get("/login/test_auth_endpoint", headers=headers)
+
+    assert resp.status_code == 200
+    current_user = resp.json()["current_user"]
+    assert current_user["id"] == user_id
+    assert current_user["token_version"] == 0
+
+
+async def test_stateless_token_is_revoked_on_delete(
+    stateless_client, assert_query_count
+):
+    user_id, headers = await _create_user_and_login(stateless_client)
+    resp = await stateless_client.delete(f"/user/?user_id={user_id}")
+    assert resp.status_code == 200
+
+    with assert_query_count(0):
+        resp = await stateless_client.get("/login/test_auth_endpoint", headers=headers)
+
+    assert resp.status_code == 401
+
+
+async def test_stateless_token_is_revoked_on_email_change(
+    stateless_client, assert_query_count
+):
+    user_id, headers = await _create_user_and_login(stateless_client)
+    resp = await stateless_client.patch(
+        f"/user/?user_id={user_id}", json={"email": "new@test.com"}
+    )
+    assert resp.status_code == 200
+
+    with assert_query_count(0):
+        resp = await stateless_client.get("/login/test_auth_endpoint", headers=headers)
+
+    assert resp.status_code == 401
+
+
+async def test_stateless_token_issued_before_start_is_checked_in_database(
+    stateless_client, create_user_in_db, assert_query_count, test_settings
+):
+    # Пользователь удален до перезапуска: в памяти процесса отзыва нет
+    user_id = uuid4()
+    await create_user_in_db(
+        id=user_id,
+        first_name="test",
+        last_name="test",
+        email="test@test.com",
+        is_active=False,
+    )
+    token = create_access_token(
+        data={
+            "sub": "test@test.com",
+            "uid": str(user_id),
+            "ver": 0,
+            "iat": time.time() - 60,
+        },
+        settings=test_settings,
+    )
+
+    with assert_query_count(1):
+        resp = await stateless_client.get(
+            "/login/test_auth_endpoint", headers={"Authorization": f"Bearer {token}"}
+        )
+
+    assert resp.status_code == 401
+
+
+async def test_token_with_stale_version_is_rejected(
+    client, create_user_in_db, test_settings
+):
+    user_id = uuid4()
+    await create_user_in_db(
+        id=user_id,
+        first_name="test",
+        last_name="test",
+        email="test@test.com",
+        is_active=True,
+    )
+
+    for token_version, expected_status in [(1, 401), (0, 200)]:
+        token = create_access_token(
+            data={"sub": "test@test.com", "uid": str(user_id), "ver": token_version},
+            settings=test_settings,
+        )
+        resp = await client.get(
+            "/login/test_auth_endpoint", headers={"Authorization": f"Bearer {token}"}
+        )
+        assert resp.status_code == expected_status
+
+
+async def test_token_is_checked_with_app_secret_key(
+    make_app, create_user_in_db, test_settings, make_client
+):
+    await create_user_in_db(
+        id=uuid4(),
+        first_name="test",
+        last_name="test",
+        email="test@test.com",
+        is_active=True,
+    )
+    token = create_access_token(data={"sub": "test@test.com"}, settings=test_settings)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    for secret_key, expected_status in [
+        (test_settings.SECRET_KEY, 200),
+        ("other_secret_key", 401),
+    ]:
+        app = make_app(SECRET_KEY=secret_key)
+        async with make_client(app) as ac:
+            resp = await ac.get("/login/test_auth_endpoint", headers=headers)
+        assert resp.status_code == expected_status
+
+
+async def _login_with_hash(
+    make_app, make_client, create_user_in_db, hashed_password: str
+):
+    user_id = uuid4()
+    await create_user_in_db(
+        id=user_id,
+        first_name="test",
+        last_name="test",
+        email="test@test.com",
+        is_active=True,
+        hashed_password=hashed_password,
+    )
+    app = make_app(HASH_SCHEME="bcrypt", HASH_BCRYPT_ROUNDS=5)
+    async with make_client(app) as ac:
+        return user_id, await ac.post(
+            "/login/token", data={"username": "test@test.com", "password": "password"}
+        )
+
+
+async def test_login_rehashes_password_below_configured_cost(
+    make_app, make_client, create_user_in_db, get_user_from_db
+):
+    old_hash = Hasher.get_password_hash("password", options=("bcrypt", 4))
+
+    user_id, resp = await _login_with_hash(
+        make_app, make_client, create_user_in_db, old_hash
+    )
+
+    assert resp.status_code == 200
+    new_hash = (await get_user_from_db(user_id))["hashed_password"]
+    assert new_hash.startswith("$2b$05$")
+    assert Hasher.verify_password("password", new_hash)
+
+
+async def test_login_keeps_password_hash_at_configured_cost(
+    make_app, make_client, create_user_in_db, get_user_from_db, assert_query_count
+):
+    current_hash = Hasher.get_password_hash("password", options=("bcrypt", 5))
+
+    with assert_query_count(1):
+        user_id, resp = await _login_with_hash(
+            make_app, make_client, create_user_in_db, current_hash
+        )
+
+    assert resp.status_code == 200
+    assert (await get_user_from_db(user_id))["hashed_password"] == current_hash
@@ -0,0 +1,16 @@
+# tests/test_handlers/test_metrics_handlers.py
+
+
+async def test_metrics_count_requests_by_route(client):
+    await client.get("/health/live")
+    await client.get("/no-such-path")
+
+    resp = await client.get("/metrics")
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert 'route="/health/live",status="200"' in resp.text
+    assert 'route="unmatched",status="404"' in resp.text
+    assert "http_request_duration_seconds_bucket" in resp.text
+    assert "hasher_queue_depth" in resp.text
+    assert "hasher_task_seconds_bucket" in resp.text
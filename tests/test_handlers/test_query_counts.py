@@ -0,0 +1,76 @@
+# tests/test_handlers/test_query_counts.py
+"""Бюджет запросов к базе для каждого эндпоинта.
+
+Если тест падает, обработчик стал ходить в базу чаще: либо это исправить,
+либо осознанно поднять бюджет здесь. Чтение и запись одним запросом идут
+в AUTOCOMMIT и стоят один запрос; пакетное создание - BEGIN, INSERT и COMMIT.
+"""
+from uuid import uuid4
+
+import pytest_asyncio
+
+USER_DATA = {
+    "first_name": "test",
+    "last_name": "test",
+    "email": "test@test.com",
+    "password": "password",
+}
+
+
+@pytest_asyncio.fixture
+async def created_user(client) -> dict:
+    resp = await client.post("/user/", json=USER_DATA)
+    assert resp.status_code == 200
+    return resp.json()
+
+
+async def test_create_user_queries(client, assert_query_count):
+    with assert_query_count(1):
+        resp = await client.post("/user/", json=USER_DATA)
+    assert resp.status_code == 200
+
+
+async def test_create_users_batch_queries(client, assert_query_count):
+    users = [{**USER_DATA, "email": f"test{number}@test.com"} for number in range(3)]
+    with assert_query_count(3):
+        resp = await client.post("/user/batch", json={"users": users})
+    assert resp.status_code == 200
+
+
+async def test_get_user_queries(client, created_user, assert_query_count):
+    with assert_query_count(1):
+        resp = await client.get(f"/user/?user_id={created_user['id']}")
+    assert resp.status_code == 200
+
+
+async def test_get_users_batch_queries(client, created_user, assert_query_count):
+    with assert_query_count(1):
+        resp = await client.get(f"/user/batch?ids={created_user['id']},{uuid4()}")
+    assert resp.status_code == 200
+
+
+async def test_list_users_queries(client, created_user, assert_query_count):
+    with assert_query_count(1):
+        resp = await client.get("/user/list")
+    assert resp.status_code == 200
+
+
+async def test_update_user_queries(client, created_user, assert_query_count):
+    with assert_query_count(1):
+        resp = await client.patch(
+            f"/user/?user_id={created_user['id']}", json={"first_name": "new"}
+        )
+    assert resp.status_code == 200
+
+
+async def test_delete_user_queries(client, created_user, assert_query_count):
+    with assert_query_count(1):
+        resp = await client.delete(f"/user/?user_id={created_user['id']}")
+    assert resp.status_code == 200
+
+
+async def test_login_queries(client, created_user, assert_query_count):
+    form_data = {"username": USER_DATA["email"], "password": USER_DATA["password"]}
+    with assert_query_count(1):
+        resp = await client.post("/login/token", data=form_data)
+    assert resp.status_code == 200
@@ -0,0 +1,71 @@
+# tests/test_handlers/test_replica_routing.py
+"""Чтения идут на реплику, а после записи клиента - в основную базу.
+
+Роль реплики играет та же тестовая база, поэтому проверяется только
+маршрутизация: какой пул (admission) принял запрос.
+"""
+import time
+from uuid import uuid4
+
+import pytest
+
+import utils.settings as settings
+from db.session import READ_YOUR_WRITES_COOKIE
+
+
+@pytest.fixture
+def replica_app(make_app, make_database):
+    overrides = {"REPLICA_DATABASE_URL": settings.TEST_DATABASE_URL}
+    return make_app(own_database=make_database(**overrides), **overrides)
+
+
+async def test_reads_go_to_replica(replica_app, make_client):
+    database = replica_app.state.db
+    async with make_client(replica_app) as client:
+        resp = await client.get("/user/list")
+
+    assert resp.status_code == 200
+    assert database.replica_admission.admitted == 1
+    assert database.admission.admitted == 0
+
+
+async def test_reads_after_write_go_to_primary(
+    replica_app, make_client, create_user_in_db
+):
+    database = replica_app.state.db
+    user_id = uuid4()
+    await create_user_in_db(
+        id=user_id,
+        first_name="test",
+        last_name="test",
+        email="test@test.com",
+        is_active=True,
+    )
+
+    async with make_client(replica_app) as client:
+        resp = await client.patch(
+            f"/user/?user_id={user_id}", json={"first_name": "new"}
+        )
+        assert resp.status_code == 200
+        assert READ_YOUR_WRITES_COOKIE in resp.cookies
+        admitted_to_primary = database.admission.admitted
+
+        resp = await client.get(f"/user/?user_id={user_id}")
+
+    assert resp.status_code == 200
+    assert resp.json()["first_name"] == "new"
+    assert database.admission.admitted == admitted_to_primary + 1
+    assert database.replica_admission.admitted == 0
+
+
+async def test_reads_return_to_replica_after_window(replica_app, make_client):
+    database = replica_app.state.db
+    written_long_ago = str(time.time() - settings.READ_YOUR_WRITES_SECONDS - 1)
+    async with make_client(
+        replica_app, cookies={READ_YOUR_WRITES_COOKIE: written_long_ago}
+    ) as client:
+        resp = await client.get("/user/list")
+
+    assert resp.status_code == 200
+    assert database.replica_admission.admitted == 1
+    assert database.admission.admitted == 0
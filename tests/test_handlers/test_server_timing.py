@@ -0,0 +1,60 @@
+# tests/test_handlers/test_server_timing.py
+from uuid import uuid4
+
+
+def _metrics(resp) -> dict:
+    metrics = {}
+    for metric in resp.headers["Server-Timing"].split(", "):
+        name, duration = metric.split(";dur=")
+        metrics[name] = float(duration)
+    return metrics
+
+
+async def test_server_timing_total(client):
+    resp = await client.get("/health/live")
+    assert resp.status_code == 200
+    assert "total" in _metrics(resp)
+
+
+async def test_server_timing_db_and_serialization(client, create_user_in_db):
+    user_id = uuid4()
+    await create_user_in_db(
+        id=user_id,
+        first_name="test",
+        last_name="test",
+        email="test@test.com",
+        is_active=True,
+    )
+    resp = await client.get(f"/user/?user_id={user_id}")
+    assert resp.status_code == 200
+
+    metrics = _metrics(resp)
+    assert metrics["db"] > 0
+    # Пишется TimedQueuePool.connect при каждом checkout
+    assert "db-pool" in metrics
+    assert "serialize" in metrics
+    assert metrics["total"] >= metrics["db"]
+
+
+async def test_query_count_header_is_off_by_default(client):
+    resp = await client.get("/user/list")
+    assert resp.status_code == 200
+    assert "X-Query-Count" not in resp.headers
+
+
+async def test_query_count_header(make_app, make_client):
+    app = make_app(SERVER_TIMING_QUERY_COUNT_HEADER=True)
+    async with make_client(app) as ac:
+        resp = await ac.post(
+            "/user/",
+            json={
+                "first_name": "test",
+                "last_name": "test",
+                "email": "test@test.com",
+                "password": "password",
+            },
+        )
+
+    assert resp.status_code == 200
+    # Считаются только SQL запросы, без BEGIN/COMMIT
+    assert resp.headers["X-Query-Count"] == "1"
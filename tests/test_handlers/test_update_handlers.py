@@ -24,7 +24,13 @@ async def test_update_user(client, create_user_in_db, get_user_from_db):
     resp = await client.patch(f"/user/?user_id={user_data['id']}", json=update_data)
 
     assert resp.status_code == 200
-    assert resp.json() == {"id": str(user_data["id"])}
+    assert resp.json() == {
+        "id": str(user_data["id"]),
+        "first_name": update_data["first_name"],
+        "last_name": update_data["last_name"],
+        "email": update_data["email"],
+        "is_active": user_data["is_active"],
+    }
 
     user_from_db = await get_user_from_db(user_data["id"])
 
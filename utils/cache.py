@@ -0,0 +1,104 @@
+# utils/cache.py
+import time
+from collections import OrderedDict
+from typing import Any
+from typing import Dict
+from typing import Hashable
+from typing import Optional
+
+from utils.metrics import principal_cache_requests_total
+
+
+class TTLCache:
+    """Ограниченный по размеру LRU-кеш с временем жизни записей."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            self.pop(key)
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if key in self._data:
+            self.pop(key)
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        while len(self._data) > self.maxsize:
+            oldest = next(iter(self._data))
+            self.pop(oldest)
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.pop(key, None)
+        return entry[0] if entry else None
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class PrincipalCache(TTLCache):
+    """Кеш аутентифицированных пользователей по ``sub`` из токена.
+
+    Помнит соответствие id пользователя и ключа, чтобы запись можно было
+    сбросить после изменения или удаления пользователя. Сброс виден только
+    своему процессу, поэтому с несколькими воркерами кеш выключается
+    (``main.run``).
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self._keys_by_user_id: Dict[Hashable, Hashable] = {}
+        # Номер последнего сброса по id пользователя. Живет не дольше
+        # записи кеша: загрузка, начатая раньше, давно закончилась бы
+        self.generation = 0
+        self._invalidated = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = super().get(key)
+        principal_cache_requests_total.labels(
+            "hit" if value is not None else "miss"
+        ).inc()
+        return value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        """Кладет ``value``; ``generation`` - ``self.generation`` до его загрузки.
+
+        Если пользователя сбросили после начала загрузки, строка могла быть
+        прочитана до изменения, и она не кладется.
+        """
+        if generation is not None:
+            invalidated = self._invalidated.get(value.id)
+            if invalidated is not None and invalidated > generation:
+                return
+        super().set(key, value)
+        self._keys_by_user_id[value.id] = key
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        value = super().pop(key)
+        if value is not None:
+            self._keys_by_user_id.pop(value.id, None)
+        return value
+
+    def clear(self) -> None:
+        super().clear()
+        self._keys_by_user_id.clear()
+
+    def invalidate_user(self, user_id: Hashable) -> None:
+        self.generation += 1
+        self._invalidated.set(user_id, self.generation)
+        key = self._keys_by_user_id.get(user_id)
+        if key is not None:
+            self.pop(key)
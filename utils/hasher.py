@@ -1,14 +1,230 @@
 # utuls/hasher.py
-from passlib.context import CryptContext
+import argparse
+import asyncio
+import time
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from utils import settings
+from utils import timing
+from utils.metrics import hasher_queue_depth
+from utils.metrics import hasher_rejected_total
+from utils.metrics import hasher_task_seconds
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+SUPPORTED_SCHEMES = ("bcrypt", "argon2")
+
+
+def build_context(
+    scheme: str = settings.HASH_SCHEME,
+    bcrypt_rounds: int = settings.HASH_BCRYPT_ROUNDS,
+    argon2_time_cost: int = settings.HASH_ARGON2_TIME_COST,
+    argon2_memory_cost: int = settings.HASH_ARGON2_MEMORY_COST,
+) -> "CryptContext":
+    # passlib импортируется при первом хешировании, а не при старте
+    from passlib.context import CryptContext
+
+    if scheme not in SUPPORTED_SCHEMES:
+        raise ValueError(f"Unknown hash scheme: {scheme}")
+    # Новые хеши считаются первой схемой, остальные только проверяются и
+    # помечаются устаревшими. min_rounds помечает хеши с меньшей стоимостью.
+    return CryptContext(
+        schemes=[scheme] + [other for other in SUPPORTED_SCHEMES if other != scheme],
+        deprecated="auto",
+        bcrypt__rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+        argon2__rounds=argon2_time_cost,
+        argon2__min_rounds=argon2_time_cost,
+        argon2__memory_cost=argon2_memory_cost,
+    )
+
+
+def context_options(settings) -> Tuple:
+    """Аргументы ``build_context`` из settings приложения."""
+    return (
+        settings.HASH_SCHEME,
+        settings.HASH_BCRYPT_ROUNDS,
+        settings.HASH_ARGON2_TIME_COST,
+        settings.HASH_ARGON2_MEMORY_COST,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_pwd_context(*options) -> "CryptContext":
+    return build_context(*options)
 
 
 class Hasher:
+    # options - аргументы build_context; пустой кортеж - utils.settings.
+    # Передаются явно, а не через глобальное состояние, потому что в
+    # process-бэкенде вызов выполняется в другом процессе.
+
+    @staticmethod
+    def verify_password(
+        plain_password: str, hashed_password: str, options: Tuple = ()
+    ) -> bool:
+        return get_pwd_context(*options).verify(plain_password, hashed_password)
+
     @staticmethod
-    def verify_password(plain_password: str, hashed_password: str) -> bool:
-        return pwd_context.verify(plain_password, hashed_password)
+    def verify_and_update(
+        plain_password: str, hashed_password: str, options: Tuple = ()
+    ) -> Tuple[bool, Optional[str]]:
+        """Проверяет пароль и, если хеш устарел, возвращает новый."""
+        return get_pwd_context(*options).verify_and_update(
+            plain_password, hashed_password
+        )
 
     @staticmethod
-    def get_password_hash(password: str) -> str:
-        return pwd_context.hash(password)
+    def get_password_hash(password: str, options: Tuple = ()) -> str:
+        return get_pwd_context(*options).hash(password)
+
+
+class HasherOverloadedError(Exception):
+    """Очередь на хеширование переполнена."""
+
+
+class AsyncHasher:
+    """Выполняет хеширование паролей в пуле потоков или процессов.
+
+    Количество ожидающих и выполняющихся задач ограничено ``max_queue``:
+    при превышении лимита бросается ``HasherOverloadedError``, чтобы
+    обработчик мог сразу ответить 503 вместо бесконечного ожидания.
+    """
+
+    def __init__(
+        self,
+        backend: str = "thread",
+        max_workers: int = 4,
+        max_queue: int = 64,
+        options: Tuple = (),
+    ):
+        if backend not in ("thread", "process"):
+            raise ValueError(f"Unknown hasher backend: {backend}")
+        self.backend = backend
+        self.options = options
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+
+        self.in_flight = 0
+        self.submitted = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.backend == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="hasher"
+                )
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self.in_flight >= self.max_queue:
+            self.rejected += 1
+            hasher_rejected_total.inc()
+            raise HasherOverloadedError(
+                f"Hasher queue is full ({self.in_flight}/{self.max_queue})"
+            )
+
+        self.in_flight += 1
+        self.submitted += 1
+        hasher_queue_depth.inc()
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.in_flight -= 1
+            hasher_queue_depth.dec()
+            hasher_task_seconds.observe(elapsed)
+            # Вместе с ожиданием свободного воркера
+            timing.record("hash", elapsed)
+
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(
+            Hasher.verify_password, plain_password, hashed_password, self.options
+        )
+
+    async def verify_and_update(
+        self, plain_password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        return await self._run(
+            Hasher.verify_and_update, plain_password, hashed_password, self.options
+        )
+
+    async def get_password_hash(self, password: str) -> str:
+        return await self._run(Hasher.get_password_hash, password, self.options)
+
+    async def get_password_hashes(self, passwords: List[str]) -> List[str]:
+        """Хеширует пачку паролей окнами по ``max_workers`` задач."""
+        hashes: List[str] = []
+        for start in range(0, len(passwords), self.max_workers):
+            window = passwords[start : start + self.max_workers]
+            hashes.extend(
+                await asyncio.gather(
+                    *(self.get_password_hash(password) for password in window)
+                )
+            )
+        return hashes
+
+    async def warm_up(self) -> None:
+        """Запускает все воркеры пула, чтобы первый логин не ждал их старта."""
+        hashes = await asyncio.gather(
+            *(self.get_password_hash("warm-up") for _ in range(self.max_workers))
+        )
+        await self.verify_password("warm-up", hashes[0])
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def calibrate(scheme: str, target_ms: float, samples: int = 3) -> dict:
+    """Подбирает наибольшую стоимость, при которой хеш не дольше target_ms."""
+    if scheme == "bcrypt":
+        option, candidates = "bcrypt_rounds", range(4, 32)
+    else:
+        option, candidates = "argon2_time_cost", range(1, 64)
+
+    best = {option: candidates[0], "ms": None}
+    for cost in candidates:
+        context = build_context(scheme=scheme, **{option: cost})
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            context.hash("calibration-password")
+            timings.append((time.perf_counter() - started) * 1000)
+        elapsed_ms = min(timings)
+        if elapsed_ms > target_ms and best["ms"] is not None:
+            break
+        best = {option: cost, "ms": elapsed_ms}
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Подбор стоимости хеширования под целевую задержку"
+    )
+    parser.add_argument("--scheme", choices=SUPPORTED_SCHEMES, default="bcrypt")
+    parser.add_argument("--target-ms", type=float, default=250.0)
+    args = parser.parse_args()
+
+    result = calibrate(args.scheme, args.target_ms)
+    print(f"# {args.scheme}: {result['ms']:.1f} ms per hash")
+    print(f"HASH_SCHEME={args.scheme}")
+    if args.scheme == "bcrypt":
+        print(f"HASH_BCRYPT_ROUNDS={result['bcrypt_rounds']}")
+    else:
+        print(f"HASH_ARGON2_TIME_COST={result['argon2_time_cost']}")
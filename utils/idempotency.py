@@ -0,0 +1,314 @@
+# utils/idempotency.py
+import asyncio
+import hashlib
+import hmac
+import json
+from abc import ABC
+from abc import abstractmethod
+from logging import getLogger
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+from utils.cache import TTLCache
+
+logger = getLogger(__name__)
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+AUTHORIZATION_HEADER = b"authorization"
+REPLAYED_HEADER = (b"idempotent-replayed", b"true")
+MAX_KEY_LENGTH = 255
+
+# Временные ответы не сохраняются: повтор должен выполниться заново
+NOT_STORED_STATUSES = {429, 503}
+
+
+class StoredResponse(NamedTuple):
+    fingerprint: str
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+
+class IdempotencyBackend(ABC):
+    """Хранилище ответов по ключу идемпотентности.
+
+    Запрос сначала захватывает ключ (``claim``), затем сохраняет ответ
+    (``set``) или снимает захват (``release``). Остальные запросы с тем же
+    ключом тем временем ждут (``wait``). Общее для воркеров хранилище -
+    ``db.idempotency.DatabaseIdempotencyBackend``.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[StoredResponse]:
+        """Сохраненный ответ или None, если ключа нет или он устарел."""
+
+    @abstractmethod
+    async def claim(self, key: str) -> bool:
+        """Захватывает ключ; False, если его уже держит другой запрос."""
+
+    @abstractmethod
+    async def set(self, key: str, response: StoredResponse) -> None:
+        """Сохраняет ответ на время жизни ключа и снимает захват."""
+
+    @abstractmethod
+    async def release(self, key: str) -> None:
+        """Снимает захват без ответа: повтор выполнится заново."""
+
+    @abstractmethod
+    async def wait(self, key: str) -> None:
+        """Ждет, пока захвативший ключ запрос закончит (или немного)."""
+
+
+class InMemoryIdempotencyBackend(IdempotencyBackend):
+    """Ответы в ``TTLCache``: число ключей и время хранения ограничены.
+
+    Видны только своему процессу, поэтому годятся для одного воркера.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._claims: Dict[str, asyncio.Future] = {}
+
+    async def get(self, key: str) -> Optional[StoredResponse]:
+        return self._cache.get(key)
+
+    async def claim(self, key: str) -> bool:
+        if key in self._claims:
+            return False
+        self._claims[key] = asyncio.get_running_loop().create_future()
+        return True
+
+    async def set(self, key: str, response: StoredResponse) -> None:
+        self._cache.set(key, response)
+        self._finish(key)
+
+    async def release(self, key: str) -> None:
+        self._finish(key)
+
+    async def wait(self, key: str) -> None:
+        future = self._claims.get(key)
+        if future is not None:
+            await asyncio.shield(future)
+
+    def _finish(self, key: str) -> None:
+        future = self._claims.pop(key, None)
+        if future is not None:
+            future.set_result(None)
+
+
+def _json_response(status: int, detail: str) -> StoredResponse:
+    return StoredResponse(
+        fingerprint="",
+        status=status,
+        headers=[(b"content-type", b"application/json")],
+        body=json.dumps({"detail": detail}).encode(),
+    )
+
+
+class RequestTooLargeError(Exception):
+    """Тело запроса с ключом идемпотентности длиннее допустимого."""
+
+
+def _digest(secret_key: bytes, data: bytes) -> str:
+    """HMAC, а не голый sha256: по строке хранилища не подобрать пароль."""
+    return hmac.new(secret_key, data, hashlib.sha256).hexdigest()
+
+
+def _scoped_key(scope, idempotency_key: bytes, secret_key: bytes) -> str:
+    """Ключ хранилища: маршрут, учетные данные клиента и ключ клиента.
+
+    Запросы с разными заголовками Authorization не видят ключи друг друга.
+    Запросы без него (создание пользователя, логин) делят пространство
+    ключей, но ответ отдается только на то же самое тело, то есть тому,
+    кто и так знает email и пароль из запроса.
+    """
+    authorization = dict(scope["headers"]).get(AUTHORIZATION_HEADER, b"")
+    credential = _digest(secret_key, authorization) if authorization else "-"
+    return (
+        f"{scope['method']} {scope['path']} {credential} "
+        f"{idempotency_key.decode('latin-1')}"
+    )
+
+
+class IdempotencyMiddleware:
+    """Повторяет сохраненный ответ на запрос с тем же ``Idempotency-Key``.
+
+    Работает только для ``routes``: пара метод, путь -> хранилище ответов.
+    Первый ответ сохраняется вместе с отпечатком тела запроса (HMAC с
+    ``secret_key``, тело логина содержит пароль); повтор с тем же ключом
+    получает его без обращения к обработчику, а значит без хеширования и
+    запросов к базе. Тот же ключ с другим телом - 422. Тело длиннее
+    ``max_body_bytes`` не читается дальше лимита: 413. Запрос захватывает
+    ключ в ``backend`` до вызова обработчика, поэтому одновременные запросы
+    с тем же ключом, в том числе в других воркерах, ждут первый.
+    """
+
+    def __init__(
+        self,
+        app,
+        routes: Dict[Tuple[str, str], IdempotencyBackend],
+        secret_key: str,
+        max_body_bytes: int,
+    ):
+        self.app = app
+        self.routes = routes
+        self.secret_key = secret_key.encode()
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        backend = None
+        if scope["type"] == "http":
+            backend = self.routes.get((scope["method"], scope["path"]))
+        if backend is None:
+            await self.app(scope, receive, send)
+            return
+
+        idempotency_key = dict(scope["headers"]).get(IDEMPOTENCY_HEADER)
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await self._send(send, _json_response(422, "Invalid Idempotency-Key"))
+            return
+
+        try:
+            body = await self._read_body(scope, receive, self.max_body_bytes)
+        except RequestTooLargeError:
+            await self._send(send, _json_response(413, "Request body is too large"))
+            return
+        key = _scoped_key(scope, idempotency_key, self.secret_key)
+        fingerprint = _digest(self.secret_key, body)
+
+        try:
+            stored = await self._get_or_claim(backend, key)
+        except Exception:
+            # Без хранилища нельзя отличить повтор от нового запроса
+            logger.exception("Idempotency backend is unavailable")
+            await self._send(send, _json_response(503, "Try again later"))
+            return
+        if stored is not None:
+            await self._replay(send, stored, fingerprint)
+            return
+
+        response = None
+        try:
+            response = await self._call_app(scope, receive, send, body)
+        finally:
+            await self._finish(backend, key, fingerprint, response)
+
+    @staticmethod
+    async def _get_or_claim(
+        backend: IdempotencyBackend, key: str
+    ) -> Optional[StoredResponse]:
+        """Сохраненный ответ или None, если ключ захвачен этим запросом."""
+        while True:
+            stored = await backend.get(key)
+            if stored is not None:
+                return stored
+            if await backend.claim(key):
+                return None
+            # Если первый запрос ничего не сохранит, выполняемся сами
+            await backend.wait(key)
+
+    @staticmethod
+    async def _finish(
+        backend: IdempotencyBackend,
+        key: str,
+        fingerprint: str,
+        response: Optional[StoredResponse],
+    ) -> None:
+        """Сохраняет ответ или снимает захват; клиент ответ уже получил."""
+        try:
+            if response is not None and response.status not in NOT_STORED_STATUSES:
+                await backend.set(key, response._replace(fingerprint=fingerprint))
+            else:
+                await backend.release(key)
+        except Exception:
+            # Повтор выполнится заново, когда захват истечет
+            logger.exception("Failed to store idempotent response")
+
+    @staticmethod
+    async def _read_body(scope, receive, max_bytes: int) -> bytes:
+        """Читает тело целиком, но не больше ``max_bytes``."""
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            raise RequestTooLargeError
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > max_bytes:
+                raise RequestTooLargeError
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    async def _call_app(
+        self, scope, receive, send, body: bytes
+    ) -> Optional[StoredResponse]:
+        """Выполняет запрос, отдавая ответ клиенту и собирая его копию."""
+        body_sent = False
+        status = 0
+        headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+        complete = False
+
+        async def receive_body():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def send_and_capture(message):
+            nonlocal status, headers, complete
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                complete = not message.get("more_body", False)
+            await send(message)
+
+        await self.app(scope, receive_body, send_and_capture)
+        if not complete:
+            return None
+        return StoredResponse("", status, headers, b"".join(chunks))
+
+    async def _replay(self, send, stored: StoredResponse, fingerprint: str) -> None:
+        if stored.fingerprint != fingerprint:
+            await self._send(
+                send,
+                _json_response(
+                    422, "Idempotency-Key was already used with a different request"
+                ),
+            )
+            return
+        await self._send(
+            send, stored._replace(headers=stored.headers + [REPLAYED_HEADER])
+        )
+
+    @staticmethod
+    async def _send(send, response: StoredResponse) -> None:
+        headers = [
+            (name, value)
+            for name, value in response.headers
+            if name.lower() != b"content-length"
+        ]
+        headers.append((b"content-length", str(len(response.body)).encode()))
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status,
+                "headers": headers,
+            }
+        )
+        await send({"type": "http.response.body", "body": response.body})
@@ -0,0 +1,165 @@
+# utils/metrics.py
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from prometheus_client import CollectorRegistry
+from prometheus_client import Counter
+from prometheus_client import Gauge
+from prometheus_client import generate_latest
+from prometheus_client import Histogram
+from prometheus_client import multiprocess
+from prometheus_client import REGISTRY
+
+# Если задан PROMETHEUS_MULTIPROC_DIR, каждый воркер пишет значения в свои
+# файлы в этом каталоге, а /metrics любого воркера суммирует их все.
+# Каталог должен быть задан до импорта этого модуля (см. main.run).
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# Фиксированные бакеты: память на гистограмму не зависит от нагрузки
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+http_requests_total = Counter(
+    "http_requests_total",
+    "HTTP requests by route and status",
+    ["method", "route", "status"],
+)
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests being processed",
+    multiprocess_mode="livesum",
+)
+
+db_pool_checked_out = Gauge(
+    "db_pool_checked_out",
+    "Connections checked out of the pool",
+    ["database"],
+    multiprocess_mode="livesum",
+)
+db_pool_overflow = Gauge(
+    "db_pool_overflow",
+    "Connections open above pool_size",
+    ["database"],
+    multiprocess_mode="livesum",
+)
+db_pool_wait_seconds = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting for a pool connection",
+    ["database"],
+    buckets=LATENCY_BUCKETS,
+)
+
+hasher_queue_depth = Gauge(
+    "hasher_queue_depth",
+    "Password hashing tasks queued or running",
+    multiprocess_mode="livesum",
+)
+hasher_rejected_total = Counter(
+    "hasher_rejected_total", "Password hashing tasks rejected as overloaded"
+)
+hasher_task_seconds = Histogram(
+    "hasher_task_seconds",
+    "Password hashing task latency, including the wait for a free worker",
+    buckets=LATENCY_BUCKETS,
+)
+
+principal_cache_requests_total = Counter(
+    "principal_cache_requests_total",
+    "Authenticated user cache lookups by result",
+    ["result"],
+)
+login_rate_limited_total = Counter(
+    "login_rate_limited_total",
+    "Login attempts rejected by the rate limiter",
+    ["dimension"],
+)
+
+
+def render_latest() -> bytes:
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def prepare_multiprocess_dir() -> str:
+    """Готовит общий каталог метрик до запуска воркеров.
+
+    Без PROMETHEUS_MULTIPROC_DIR создается временный каталог; файлы прошлого
+    запуска из заданного каталога удаляются, иначе счетчики продолжат
+    старые значения.
+    """
+    path = os.environ.get(MULTIPROC_DIR_ENV)
+    if not path:
+        path = tempfile.mkdtemp(prefix="prometheus-")
+        os.environ[MULTIPROC_DIR_ENV] = path
+    directory = Path(path)
+    directory.mkdir(parents=True, exist_ok=True)
+    for stale in directory.glob("*.db"):
+        stale.unlink()
+    return path
+
+
+def mark_process_dead() -> None:
+    """Убирает live-gauge остановившегося воркера из общей суммы."""
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class MetricsMiddleware:
+    """Считает запросы, задержку и число обрабатываемых запросов по маршрутам.
+
+    Метка ``route`` - шаблон пути FastAPI (``/user/``), а не сам путь, чтобы
+    число временных рядов было ограничено; ненайденные пути идут в
+    ``unmatched``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            http_request_duration_seconds.labels(method, route_path).observe(
+                time.perf_counter() - started
+            )
+            http_requests_total.labels(method, route_path, str(status)).inc()
@@ -0,0 +1,97 @@
+# utils/ratelimit.py
+import math
+import time
+from abc import ABC
+from abc import abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+from utils.metrics import login_rate_limited_total
+
+
+class RateLimitBackend(ABC):
+    """Хранилище счетчиков попыток.
+
+    Реализация в памяти считает лимиты в пределах одного процесса. Чтобы
+    несколько воркеров делили лимиты, достаточно реализовать ``hit`` поверх
+    общего хранилища (например, INCR + EXPIRE в Redis) и передать backend
+    в ``LoginRateLimiter``.
+    """
+
+    @abstractmethod
+    async def hit(self, key: str, limit: int, window: float) -> float:
+        """Учитывает попытку и возвращает, через сколько секунд повторить.
+
+        0 означает, что попытка укладывается в лимит.
+        """
+
+
+class InMemorySlidingWindowBackend(RateLimitBackend):
+    """Скользящее окно по двум соседним фиксированным окнам.
+
+    На ключ хранится три числа, а не журнал всех попыток, поэтому память
+    не зависит от лимита. Число ключей ограничено ``max_keys`` (LRU).
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[str, list]" = OrderedDict()
+
+    async def hit(self, key: str, limit: int, window: float) -> float:
+        now = time.monotonic()
+        current_start = now - now % window
+
+        entry = self._windows.get(key)
+        if entry is None:
+            entry = [current_start, 0, 0]
+        elif entry[0] != current_start:
+            previous = entry[1] if current_start - entry[0] == window else 0
+            entry = [current_start, 0, previous]
+        self._windows[key] = entry
+        self._windows.move_to_end(key)
+        while len(self._windows) > self.max_keys:
+            self._windows.popitem(last=False)
+
+        window_start, current, previous = entry
+        elapsed = (now - window_start) / window
+        if previous * (1 - elapsed) + current >= limit:
+            return window_start + window - now
+        entry[1] += 1
+        return 0.0
+
+
+class LoginRateLimiter:
+    """Ограничивает попытки входа по email и по IP клиента."""
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        per_email: int,
+        per_ip: int,
+        window: float,
+    ):
+        self.backend = backend
+        self.per_email = per_email
+        self.per_ip = per_ip
+        self.window = window
+
+        self.rejected_by_email = 0
+        self.rejected_by_ip = 0
+
+    async def check(self, email: str, ip: Optional[str]) -> int:
+        """Возвращает Retry-After в секундах или 0, если попытку можно пустить."""
+        if ip is not None:
+            retry_after = await self.backend.hit(f"ip:{ip}", self.per_ip, self.window)
+            if retry_after:
+                self.rejected_by_ip += 1
+                login_rate_limited_total.labels("ip").inc()
+                return math.ceil(retry_after)
+
+        retry_after = await self.backend.hit(
+            f"email:{email.lower()}", self.per_email, self.window
+        )
+        if retry_after:
+            self.rejected_by_email += 1
+            login_rate_limited_total.labels("email").inc()
+            return math.ceil(retry_after)
+        return 0
@@ -0,0 +1,63 @@
+# utils/revocation.py
+import time
+from typing import Dict
+from typing import Hashable
+from typing import Optional
+from typing import Tuple
+
+
+class RevocationSet:
+    """Минимальная действительная версия токена для недавно измененных
+    пользователей.
+
+    Запись нужна только пока живут выданные до изменения токены, поэтому
+    через ``ttl`` (время жизни токена) она удаляется. Вытеснения по размеру
+    нет: потеря записи означала бы, что отозванный токен снова действует.
+
+    Набор живет в памяти процесса и видит только отзывы, сделанные в нем
+    после создания. Поэтому ``TOKEN_STATELESS`` допустим лишь с одним
+    воркером (``main.run`` не запустит несколько), а токены, выданные до
+    старта процесса, проверяются по базе (см. ``covers``).
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._versions: Dict[Hashable, Tuple[int, float]] = {}
+        self._next_purge = time.monotonic() + ttl
+        self.tracking_since = time.time()
+
+    def covers(self, issued_at: Optional[float]) -> bool:
+        """Записан ли здесь любой отзыв токена, выданного в ``issued_at``.
+
+        Токен, выданный до создания набора (например, до перезапуска), мог
+        быть отозван раньше, и этот отзыв здесь потерян.
+        """
+        return issued_at is not None and issued_at >= self.tracking_since
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+    def revoke(self, user_id: Hashable, token_version: int) -> None:
+        """Токены пользователя с версией меньше ``token_version`` недействительны."""
+        self._purge()
+        self._versions[user_id] = (token_version, time.monotonic() + self.ttl)
+
+    def is_revoked(self, user_id: Hashable, token_version: int) -> bool:
+        entry = self._versions.get(user_id)
+        if entry is None:
+            return False
+        min_version, expires_at = entry
+        if expires_at <= time.monotonic():
+            return False
+        return token_version < min_version
+
+    def _purge(self) -> None:
+        now = time.monotonic()
+        if now < self._next_purge:
+            return
+        self._versions = {
+            user_id: entry
+            for user_id, entry in self._versions.items()
+            if entry[1] > now
+        }
+        self._next_purge = now + self.ttl
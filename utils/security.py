@@ -1,14 +1,31 @@
 # utils/secutity.py
+import time
+from dataclasses import dataclass
 from datetime import datetime
 from datetime import timedelta
 from typing import Optional
+from uuid import UUID
 
-from jose import jwt
+from utils.timing import timed
 
-from utils import settings
 
+@dataclass(frozen=True)
+class TokenPrincipal:
+    """Пользователь, восстановленный из подписанных claims токена."""
+
+    id: UUID
+    email: str
+    token_version: int
+    is_active: bool = True
+
+
+def create_access_token(
+    data: dict, settings, expires_delta: Optional[timedelta] = None
+):
+    """Подписывает токен ключом и алгоритмом из ``settings`` приложения."""
+    # jose тянет за собой cryptography, поэтому импортируется при первом вызове
+    from jose import jwt
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -18,8 +35,29 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         )
 
     to_encode.update({"exp": expire})
+    # Дробные секунды: по iat проверяется, выдан ли токен после старта
+    # процесса (см. RevocationSet.covers)
+    to_encode.setdefault("iat", time.time())
 
-    encoded_jwt = jwt.encode(
-        to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
-    )
+    with timed("jwt"):
+        encoded_jwt = jwt.encode(
+            to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
+        )
     return encoded_jwt
+
+
+def decode_access_token(token: str, settings) -> dict:
+    """Проверяет подпись и срок действия токена, при ошибке ValueError.
+
+    Ключ и алгоритм - из ``settings`` приложения, как и в create_access_token.
+    """
+    from jose import jwt
+    from jose import JWTError
+
+    try:
+        with timed("jwt"):
+            return jwt.decode(
+                token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+            )
+    except JWTError as err:
+        raise ValueError(str(err)) from err
@@ -0,0 +1,71 @@
+# utils/services.py
+from typing import Optional
+
+from fastapi import Request
+
+from utils.bloom import BloomFilter
+from utils.cache import PrincipalCache
+from utils.hasher import AsyncHasher
+from utils.hasher import context_options
+from utils.idempotency import IdempotencyBackend
+from utils.idempotency import InMemoryIdempotencyBackend
+from utils.ratelimit import InMemorySlidingWindowBackend
+from utils.ratelimit import LoginRateLimiter
+from utils.revocation import RevocationSet
+
+
+class Services:
+    """Состояние приложения вне базы данных: хешер, кеши, лимиты, фильтры.
+
+    Создается в ``main.create_app`` из переданных settings и хранится в
+    ``app.state.services``; два приложения с разными settings ничего не
+    делят. Все хранилища здесь живут в памяти своего процесса.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.hasher = AsyncHasher(
+            backend=settings.HASHER_BACKEND,
+            max_workers=settings.HASHER_MAX_WORKERS,
+            max_queue=settings.HASHER_MAX_QUEUE,
+            options=context_options(settings),
+        )
+        # None - кеш выключен (PRINCIPAL_CACHE_SIZE=0)
+        self.principal_cache: Optional[PrincipalCache] = None
+        if settings.PRINCIPAL_CACHE_SIZE > 0:
+            self.principal_cache = PrincipalCache(
+                maxsize=settings.PRINCIPAL_CACHE_SIZE,
+                ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+            )
+        self.revocations = RevocationSet(ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+        # None - попытки входа не ограничиваются. Лимитер можно подменить
+        # после создания приложения (тесты, общий backend для воркеров)
+        self.login_rate_limiter: Optional[LoginRateLimiter] = None
+        if settings.LOGIN_RATE_LIMIT_ENABLED:
+            self.login_rate_limiter = LoginRateLimiter(
+                backend=InMemorySlidingWindowBackend(),
+                per_email=settings.LOGIN_RATE_LIMIT_PER_EMAIL,
+                per_ip=settings.LOGIN_RATE_LIMIT_PER_IP,
+                window=settings.LOGIN_RATE_LIMIT_WINDOW_SECONDS,
+            )
+        # Занятые email (включая удаленных пользователей). Заполняется при
+        # старте (db.warmup.load_taken_emails) и после каждой записи email.
+        # Email, созданный другим воркером, здесь не виден, и такой дубликат
+        # отсекается уже ON CONFLICT при вставке.
+        self.taken_emails = BloomFilter(
+            capacity=settings.EMAIL_BLOOM_CAPACITY,
+            error_rate=settings.EMAIL_BLOOM_ERROR_RATE,
+        )
+        # С IDEMPOTENCY_BACKEND=database main.create_app заменяет его общим
+        self.idempotency_backend: IdempotencyBackend = InMemoryIdempotencyBackend(
+            maxsize=settings.IDEMPOTENCY_MAX_KEYS, ttl=settings.IDEMPOTENCY_TTL_SECONDS
+        )
+        # Ответ логина - действующий токен: в общую базу он не пишется,
+        # и повтор, попавший в другой воркер, просто выполнится заново
+        self.login_idempotency_backend = InMemoryIdempotencyBackend(
+            maxsize=settings.IDEMPOTENCY_MAX_KEYS, ttl=settings.IDEMPOTENCY_TTL_SECONDS
+        )
+
+
+def get_services(request: Request) -> Services:
+    return request.app.state.services
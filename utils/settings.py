@@ -16,3 +16,119 @@ TEST_DATABASE_URL = env.str(
 SECRET_KEY: str = env.str("SECRET_KEY", default="secret_key")
 ALGORITHM: str = env.str("ALGORITHM", default="HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES: int = env.int("ACCESS_TOKEN_EXPIRE_MINUTES", default=30)
+
+# Пул для хеширования паролей: "thread" или "process"
+HASHER_BACKEND: str = env.str("HASHER_BACKEND", default="thread")
+HASHER_MAX_WORKERS: int = env.int("HASHER_MAX_WORKERS", default=4)
+HASHER_MAX_QUEUE: int = env.int("HASHER_MAX_QUEUE", default=64)
+# Retry-After для запросов, отклоненных из-за полной очереди хеширования
+HASHER_RETRY_AFTER_SECONDS: int = env.int("HASHER_RETRY_AFTER_SECONDS", default=1)
+
+# Кеш пользователей, прошедших проверку JWT; 0 - выключен.
+# main.run выключает его, если воркеров больше одного
+PRINCIPAL_CACHE_SIZE: int = env.int("PRINCIPAL_CACHE_SIZE", default=10000)
+PRINCIPAL_CACHE_TTL_SECONDS: float = env.float(
+    "PRINCIPAL_CACHE_TTL_SECONDS", default=30.0
+)
+
+# Пакетные операции с пользователями
+USER_BATCH_MAX_SIZE: int = env.int("USER_BATCH_MAX_SIZE", default=5000)
+# Создание хеширует пароль каждого нового пользователя (~250 мс на ядро),
+# поэтому его пакет меньше: 100 паролей - несколько секунд на HASHER_MAX_WORKERS
+USER_BATCH_CREATE_MAX_SIZE: int = env.int("USER_BATCH_CREATE_MAX_SIZE", default=100)
+USER_BATCH_CHUNK_SIZE: int = env.int("USER_BATCH_CHUNK_SIZE", default=500)
+
+# Постраничный список пользователей
+USER_LIST_DEFAULT_PAGE_SIZE: int = env.int("USER_LIST_DEFAULT_PAGE_SIZE", default=50)
+USER_LIST_MAX_PAGE_SIZE: int = env.int("USER_LIST_MAX_PAGE_SIZE", default=500)
+
+# Пул соединений с базой данных
+DB_ECHO: bool = env.bool("DB_ECHO", default=False)
+DB_POOL_SIZE: int = env.int("DB_POOL_SIZE", default=10)
+DB_MAX_OVERFLOW: int = env.int("DB_MAX_OVERFLOW", default=5)
+DB_POOL_PRE_PING: bool = env.bool("DB_POOL_PRE_PING", default=True)
+DB_POOL_RECYCLE: int = env.int("DB_POOL_RECYCLE", default=1800)
+DB_POOL_TIMEOUT: float = env.float("DB_POOL_TIMEOUT", default=5.0)
+# Сколько запросов может ждать свободное соединение сверх размера пула
+DB_MAX_WAITING: int = env.int("DB_MAX_WAITING", default=20)
+DB_RETRY_AFTER_SECONDS: int = env.int("DB_RETRY_AFTER_SECONDS", default=1)
+
+# Реплика для чтения; пустая строка - все запросы идут в основную базу
+REPLICA_DATABASE_URL: str = env.str("REPLICA_DATABASE_URL", default="")
+# Сколько секунд после записи клиент читает из основной базы
+READ_YOUR_WRITES_SECONDS: float = env.float("READ_YOUR_WRITES_SECONDS", default=5.0)
+
+# Проверка JWT без обращения к базе: доверяем подписанным uid и ver,
+# отозванные версии хранятся в памяти процесса (utils/revocation.py).
+# Только с одним воркером; токены, выданные до старта процесса,
+# по-прежнему проверяются по базе.
+TOKEN_STATELESS: bool = env.bool("TOKEN_STATELESS", default=False)
+
+# Ограничение попыток входа в окне LOGIN_RATE_LIMIT_WINDOW_SECONDS.
+# Нагрузочный тест логинится сотни раз в минуту с одного IP: для него
+# ограничение выключается (LOGIN_RATE_LIMIT_ENABLED=false)
+LOGIN_RATE_LIMIT_ENABLED: bool = env.bool("LOGIN_RATE_LIMIT_ENABLED", default=True)
+LOGIN_RATE_LIMIT_PER_EMAIL: int = env.int("LOGIN_RATE_LIMIT_PER_EMAIL", default=10)
+LOGIN_RATE_LIMIT_PER_IP: int = env.int("LOGIN_RATE_LIMIT_PER_IP", default=100)
+LOGIN_RATE_LIMIT_WINDOW_SECONDS: float = env.float(
+    "LOGIN_RATE_LIMIT_WINDOW_SECONDS", default=60.0
+)
+
+# Схема хеширования новых паролей: "bcrypt" или "argon2" (нужен argon2-cffi).
+# Хеши в другой схеме или с меньшей стоимостью пересчитываются при логине.
+# Подобрать стоимость под железо: python -m utils.hasher --target-ms 250
+HASH_SCHEME: str = env.str("HASH_SCHEME", default="bcrypt")
+HASH_BCRYPT_ROUNDS: int = env.int("HASH_BCRYPT_ROUNDS", default=12)
+HASH_ARGON2_TIME_COST: int = env.int("HASH_ARGON2_TIME_COST", default=3)
+HASH_ARGON2_MEMORY_COST: int = env.int("HASH_ARGON2_MEMORY_COST", default=65536)
+
+# Сколько ID можно запросить за раз в GET /user/batch
+USER_BATCH_GET_MAX_IDS: int = env.int("USER_BATCH_GET_MAX_IDS", default=500)
+
+# Сколько соединений пула открыть и прогреть при старте приложения
+DB_POOL_WARMUP_CONNECTIONS: int = env.int(
+    "DB_POOL_WARMUP_CONNECTIONS", default=DB_POOL_SIZE
+)
+# Пауза между попытками прогреть основной пул: без него нет готовности
+DB_POOL_WARMUP_RETRY_SECONDS: float = env.float(
+    "DB_POOL_WARMUP_RETRY_SECONDS", default=1.0
+)
+
+# Запуск через `python main.py`: число воркеров (0 - по числу ядер), event
+# loop и HTTP парсер uvicorn, время на завершение запросов при SIGTERM
+WEB_HOST: str = env.str("WEB_HOST", default="0.0.0.0")
+WEB_PORT: int = env.int("WEB_PORT", default=8000)
+WEB_WORKERS: int = env.int("WEB_WORKERS", default=1)
+WEB_LOOP: str = env.str("WEB_LOOP", default="auto")
+WEB_HTTP: str = env.str("WEB_HTTP", default="auto")
+WEB_GRACEFUL_SHUTDOWN_SECONDS: int = env.int(
+    "WEB_GRACEFUL_SHUTDOWN_SECONDS", default=30
+)
+
+# Разбивка времени запроса в заголовке Server-Timing и в логе (INFO) для
+# запросов не короче SERVER_TIMING_LOG_MIN_MS
+SERVER_TIMING_ENABLED: bool = env.bool("SERVER_TIMING_ENABLED", default=True)
+SERVER_TIMING_LOG_MIN_MS: float = env.float("SERVER_TIMING_LOG_MIN_MS", default=0.0)
+# Заголовок X-Query-Count с числом SQL запросов (для отладки и тестов)
+SERVER_TIMING_QUERY_COUNT_HEADER: bool = env.bool(
+    "SERVER_TIMING_QUERY_COUNT_HEADER", default=False
+)
+
+# Запросы к базе не короче этого порога пишутся в лог (0 - не писать)
+DB_SLOW_QUERY_MS: float = env.float("DB_SLOW_QUERY_MS", default=200.0)
+
+# Bloom-фильтр занятых email: проверка дубликата до хеширования пароля
+EMAIL_BLOOM_CAPACITY: int = env.int("EMAIL_BLOOM_CAPACITY", default=1000000)
+EMAIL_BLOOM_ERROR_RATE: float = env.float("EMAIL_BLOOM_ERROR_RATE", default=0.01)
+EMAIL_BLOOM_LOAD_CHUNK_SIZE: int = env.int("EMAIL_BLOOM_LOAD_CHUNK_SIZE", default=10000)
+
+# Ответы на запросы с Idempotency-Key (POST /user/, POST /login/token)
+IDEMPOTENCY_TTL_SECONDS: float = env.float("IDEMPOTENCY_TTL_SECONDS", default=300.0)
+IDEMPOTENCY_MAX_KEYS: int = env.int("IDEMPOTENCY_MAX_KEYS", default=10000)
+IDEMPOTENCY_MAX_BODY_BYTES: int = env.int("IDEMPOTENCY_MAX_BODY_BYTES", default=65536)
+# "memory" - в памяти процесса, только для одного воркера;
+# "database" - в таблице idempotency_keys, общей для всех воркеров.
+# Пусто - выбирает main.run: database, если воркеров больше одного
+IDEMPOTENCY_BACKEND: str = env.str("IDEMPOTENCY_BACKEND", default="")
+# Сколько держится захват ключа в базе, если воркер упал, не сняв его
+IDEMPOTENCY_CLAIM_SECONDS: float = env.float("IDEMPOTENCY_CLAIM_SECONDS", default=30.0)
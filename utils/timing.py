@@ -0,0 +1,141 @@
+# utils/timing.py
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging import getLogger
+from logging import INFO
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from starlette.datastructures import MutableHeaders
+
+logger = getLogger(__name__)
+
+
+class RequestTimings:
+    """Суммарное время и число вызовов по этапам одного запроса."""
+
+    __slots__ = ("started", "durations", "counts")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def merge(self, other: "RequestTimings") -> None:
+        for name, seconds in other.durations.items():
+            self.durations[name] = self.durations.get(name, 0.0) + seconds
+            self.counts[name] = self.counts.get(name, 0) + other.counts[name]
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def header(self, total: float) -> str:
+        metrics = [
+            f"{name};dur={seconds * 1000:.2f}"
+            for name, seconds in self.durations.items()
+        ]
+        metrics.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(metrics)
+
+
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def current() -> Optional[RequestTimings]:
+    return _current_timings.get()
+
+
+@contextmanager
+def collect():
+    """Собирает этапы внутри блока в отдельный ``RequestTimings``."""
+    timings = RequestTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+def record(name: str, seconds: float) -> None:
+    """Добавляет время к текущему запросу; вне запроса ничего не делает."""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def timed(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+class ServerTimingMiddleware:
+    """Отдает разбивку времени запроса в заголовке ``Server-Timing`` и в логе.
+
+    Чистый ASGI middleware: обработчик выполняется в той же задаче, поэтому
+    видит ``RequestTimings`` через contextvar. Этапы записывают
+    ``timed``/``record`` (hash, jwt, serialize) и события engine в
+    ``db.session`` (db, db-pool); с ``query_count_header`` число запросов
+    к базе дополнительно отдается в ``X-Query-Count``. Запрос попадает в
+    лог уровня INFO, если длился не меньше ``log_min_ms``.
+    """
+
+    def __init__(self, app, log_min_ms: float = 0.0, query_count_header: bool = False):
+        self.app = app
+        self.log_min_ms = log_min_ms
+        self.query_count_header = query_count_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        status: List[int] = []
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.header(timings.elapsed()))
+                if self.query_count_header:
+                    headers.append("X-Query-Count", str(timings.counts.get("db", 0)))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_timings.reset(token)
+            self._log(scope, status[0] if status else 500, timings)
+
+    def _log(self, scope, status: int, timings: RequestTimings) -> None:
+        total_ms = timings.elapsed() * 1000
+        if total_ms < self.log_min_ms or not logger.isEnabledFor(INFO):
+            return
+        route = scope.get("route")
+        logger.info(
+            "request timings",
+            extra={
+                "method": scope["method"],
+                "path": route.path if route is not None else scope["path"],
+                "status": status,
+                "total_ms": round(total_ms, 2),
+                "timings_ms": {
+                    name: round(seconds * 1000, 2)
+                    for name, seconds in timings.durations.items()
+                },
+                "counts": dict(timings.counts),
+            },
+        )